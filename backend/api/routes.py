@@ -1,16 +1,29 @@
 """REST API routes for the web dashboard."""
 
 import asyncio
+import contextlib
+import hashlib
 import json
 import logging
-from datetime import datetime, timedelta
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends
-from fastapi.responses import FileResponse
+import aiofiles
+import aiofiles.os
+import orjson
+from fastapi import APIRouter, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 
+from backend.api.responses import ORJSONResponse
 from backend.config import settings
 from backend.claude.session import session_manager, SessionState
 from backend.claude.runner import runner_manager
@@ -62,7 +75,7 @@ class MemoryUpdateRequest(BaseModel):
 
 class RunnerStatus(BaseModel):
     """Runner status information."""
-    user_id: int
+    user_id: Optional[int] = None
     state: str
     working_directory: str
     session_id: Optional[str] = None
@@ -70,63 +83,33 @@ class RunnerStatus(BaseModel):
 
 # ============ Session Endpoints ============
 
-@router.get("/sessions", response_model=List[SessionInfo])
+@router.get("/sessions", response_model=None, responses={200: {"model": List[SessionInfo]}})
 async def list_sessions(user_id: Optional[int] = None):
     """List all sessions, optionally filtered by user."""
-    all_sessions = []
-
     if user_id:
         sessions = session_manager.get_user_sessions(user_id)
     else:
         # Get all sessions (admin view)
-        sessions = []
-        for uid in session_manager._user_sessions.keys():
-            sessions.extend(session_manager.get_user_sessions(uid))
-
-    for s in sessions:
-        all_sessions.append(SessionInfo(
-            session_id=s.session_id,
-            user_id=s.user_id,
-            working_directory=str(s.working_directory),
-            state=s.state.value,
-            created_at=s.created_at,
-            updated_at=s.updated_at,
-            message_count=len(s.messages),
-            total_cost=s.total_cost,
-            title=s.title
-        ))
-
-    return sorted(all_sessions, key=lambda x: x.updated_at, reverse=True)
-
-
-@router.get("/sessions/{session_id}", response_model=SessionDetail)
+        sessions = session_manager._sessions.values()
+
+    # Projections are cached on each session and already match SessionInfo
+    all_sessions = sorted((s.info() for s in sessions), key=itemgetter("updated_at"), reverse=True)
+
+    return ORJSONResponse(all_sessions)
+
+
+@router.get("/sessions/{session_id}", response_model=None, responses={200: {"model": SessionDetail}})
 async def get_session(session_id: str):
     """Get session details with messages."""
     session = session_manager.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    messages = [
-        MessageInfo(
-            role=m.role,
-            content=m.content,
-            timestamp=m.timestamp
-        )
-        for m in session.messages
-    ]
+    # Session data is already typed, so build the payload directly without validation
+    detail = dict(session.info())
+    detail["messages"] = session.message_rows()
 
-    return SessionDetail(
-        session_id=session.session_id,
-        user_id=session.user_id,
-        working_directory=str(session.working_directory),
-        state=session.state.value,
-        created_at=session.created_at,
-        updated_at=session.updated_at,
-        message_count=len(session.messages),
-        total_cost=session.total_cost,
-        title=session.title,
-        messages=messages
-    )
+    return ORJSONResponse(detail)
 
 
 @router.get("/sessions/{session_id}/export")
@@ -136,73 +119,120 @@ async def export_session(session_id: str):
     if not markdown:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    # Save to file
-    await session_manager.save_session_to_file(session_id)
-
-    filepath = settings.sessions_path / f"{session_id}.md"
-    return FileResponse(
-        filepath,
+    # Serve the in-memory markdown and save to file after the response is sent
+    return StreamingResponse(
+        iter([markdown.encode("utf-8")]),
         media_type="text/markdown",
-        filename=f"session_{session_id}.md"
+        headers={"Content-Disposition": f'attachment; filename="session_{session_id}.md"'},
+        background=BackgroundTask(session_manager.save_session_to_file, session_id)
     )
 
 
 # ============ Memory Endpoints ============
 
-@router.get("/memory/files")
-async def list_memory_files():
-    """List all memory workspace files."""
+# Core workspace files, served from the workspace root
+CORE_FILES = frozenset({"SOUL.md", "USER.md", "AGENTS.md", "TOOLS.md"})
+
+
+def _scan_memory_files() -> List[dict]:
+    """Collect core and memory-fragment file info (blocking)."""
     files = []
 
-    # Core files
-    for filename in ["SOUL.md", "USER.md", "AGENTS.md", "TOOLS.md"]:
-        filepath = settings.workspace_path_resolved / filename
-        if filepath.exists():
-            files.append({
-                "filename": filename,
-                "path": str(filepath),
-                "type": "core",
-                "modified": datetime.fromtimestamp(filepath.stat().st_mtime)
-            })
+    # Core files: one directory read instead of an exists()/stat() per file
+    with os.scandir(settings.workspace_path_resolved) as it:
+        for entry in it:
+            if entry.name in CORE_FILES and entry.is_file():
+                files.append({
+                    "filename": entry.name,
+                    "path": entry.path,
+                    "type": "core",
+                    "modified": datetime.fromtimestamp(entry.stat().st_mtime)
+                })
 
     # Memory fragments
-    for filepath in settings.workspace_path_resolved.joinpath("memory").glob("*.md"):
-        files.append({
-            "filename": filepath.name,
-            "path": str(filepath),
-            "type": "memory",
-            "modified": datetime.fromtimestamp(filepath.stat().st_mtime)
-        })
+    try:
+        with os.scandir(settings.memory_path) as it:
+            for entry in it:
+                if entry.name.endswith(".md") and entry.is_file():
+                    files.append({
+                        "filename": entry.name,
+                        "path": entry.path,
+                        "type": "memory",
+                        "modified": datetime.fromtimestamp(entry.stat().st_mtime)
+                    })
+    except FileNotFoundError:
+        pass
 
     return files
 
 
+@router.get("/memory/files")
+async def list_memory_files():
+    """List all memory workspace files."""
+    return await asyncio.to_thread(_scan_memory_files)
+
+
+def _workspace_file(*parts: str) -> Path:
+    """Resolve a path inside the workspace, rejecting anything that escapes it."""
+    workspace = settings.workspace_path_resolved
+    filepath = workspace.joinpath(*parts).resolve()
+    if not filepath.is_relative_to(workspace):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    return filepath
+
+
 @router.get("/memory/{filename}", response_model=MemoryFile)
-async def get_memory_file(filename: str):
-    """Get content of a memory file."""
+async def get_memory_file(filename: str, request: Request, response: Response):
+    """Get content of a memory file (supports If-Modified-Since)."""
     # Security: only allow .md files in workspace
     if not filename.endswith(".md"):
         raise HTTPException(status_code=400, detail="Only .md files allowed")
 
     # Check in workspace root first
-    filepath = settings.workspace_path_resolved / filename
-    if not filepath.exists():
+    filepath = _workspace_file(filename)
+    try:
+        stat = await aiofiles.os.stat(filepath)
+    except FileNotFoundError:
         # Check in memory subdirectory
-        filepath = settings.workspace_path_resolved / "memory" / filename
+        filepath = _workspace_file("memory", filename)
+        try:
+            stat = await aiofiles.os.stat(filepath)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+
+    # Conditional GET: skip reading the file if the client copy is current
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            if parsedate_to_datetime(if_modified_since).timestamp() >= int(stat.st_mtime):
+                return Response(status_code=304, headers={"Last-Modified": last_modified})
+        except (TypeError, ValueError):
+            pass
 
-    if not filepath.exists():
+    try:
+        async with aiofiles.open(filepath, "r", encoding="utf-8") as f:
+            content = await f.read()
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
 
-    content = filepath.read_text(encoding="utf-8")
-    modified = datetime.fromtimestamp(filepath.stat().st_mtime)
+    response.headers["Last-Modified"] = last_modified
 
     return MemoryFile(
         filename=filename,
         content=content,
-        modified=modified
+        modified=datetime.fromtimestamp(stat.st_mtime)
     )
 
 
+def _temp_file_beside(filepath: Path) -> Tuple[int, str]:
+    """Create a uniquely named temp file next to filepath, readable like a normal file."""
+    fd, tmp_path = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".tmp")
+    # mkstemp creates the file owner-only; keep the usual memory file mode
+    os.chmod(tmp_path, 0o644)
+    return fd, tmp_path
+
+
 @router.put("/memory/{filename}")
 async def update_memory_file(filename: str, request: MemoryUpdateRequest):
     """Update a memory file."""
@@ -210,34 +240,44 @@ async def update_memory_file(filename: str, request: MemoryUpdateRequest):
         raise HTTPException(status_code=400, detail="Only .md files allowed")
 
     # Determine file path
-    if filename in ["SOUL.md", "USER.md", "AGENTS.md", "TOOLS.md"]:
-        filepath = settings.workspace_path_resolved / filename
+    if filename in CORE_FILES:
+        filepath = _workspace_file(filename)
     else:
-        filepath = settings.workspace_path_resolved / "memory" / filename
+        filepath = _workspace_file("memory", filename)
 
     # Ensure directory exists
-    filepath.parent.mkdir(parents=True, exist_ok=True)
+    await aiofiles.os.makedirs(filepath.parent, exist_ok=True)
 
-    # Write content
-    filepath.write_text(request.content, encoding="utf-8")
+    # Write to a temp file and swap it in atomically; the temp name is unique
+    # so concurrent writes to the same file don't share it
+    fd, tmp_path = await asyncio.to_thread(_temp_file_beside, filepath)
+    try:
+        async with aiofiles.open(fd, "w", encoding="utf-8") as f:
+            await f.write(request.content)
+        await asyncio.to_thread(os.replace, tmp_path, filepath)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            await aiofiles.os.remove(tmp_path)
+        raise
 
     return {"status": "ok", "filename": filename}
 
 
 # ============ Runner Endpoints ============
 
-@router.get("/runners", response_model=List[RunnerStatus])
+@router.get("/runners", response_model=None, responses={200: {"model": List[RunnerStatus]}})
 async def list_runners():
     """List all active runners."""
-    runners = []
-    for user_id, runner in runner_manager._runners.items():
-        runners.append(RunnerStatus(
-            user_id=user_id,
-            state=runner.state.value,
-            working_directory=str(runner.working_directory),
-            session_id=runner.session_id
-        ))
-    return runners
+    runners = [
+        {
+            "user_id": user_id,
+            "state": runner.state.value,
+            "working_directory": str(runner.working_directory),
+            "session_id": runner.session_id
+        }
+        for _, user_id, runner in runner_manager.snapshot()
+    ]
+    return ORJSONResponse(runners)
 
 
 @router.post("/runners/{user_id}/stop")
@@ -249,10 +289,10 @@ async def stop_runner(user_id: int):
 
 # ============ Config Endpoints ============
 
-@router.get("/config")
-async def get_config():
-    """Get current configuration (safe subset)."""
-    return {
+@lru_cache(maxsize=1)
+def _config_payload() -> Tuple[dict, str]:
+    """Build the config response and its ETag (settings don't change at runtime)."""
+    payload = {
         "approved_directory": str(settings.approved_directory_path),
         "workspace_path": str(settings.workspace_path_resolved),
         "claude_timeout": settings.claude_timeout,
@@ -261,30 +301,113 @@ async def get_config():
         "rate_limit_window": settings.rate_limit_window,
         "allowed_users_count": len(settings.allowed_users_list)
     }
+    etag = f'"{hashlib.md5(orjson.dumps(payload)).hexdigest()}"'
+    return payload, etag
+
+
+@router.get("/config")
+async def get_config(request: Request):
+    """Get current configuration (safe subset)."""
+    payload, etag = _config_payload()
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return ORJSONResponse(payload, headers=headers)
 
 
 # ============ WebSocket for Real-time Logs ============
 
+@dataclass
+class ConnectionState:
+    """Per-connection outbound queue and writer task."""
+    queue: asyncio.Queue
+    writer: Optional[asyncio.Task] = None
+
+
 class ConnectionManager:
     """Manages WebSocket connections."""
 
+    # Max pending messages per client before the oldest ones are dropped
+    QUEUE_SIZE = 256
+    # Coalescing window (seconds) and max messages per broadcast frame
+    FLUSH_INTERVAL = 0.005
+    MAX_BATCH = 100
+
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Set[WebSocket] = set()
+        self._states: Dict[WebSocket, ConnectionState] = {}
+        self._pending: List[dict] = []
+        self._flush_task: Optional[asyncio.Task] = None
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        state = ConnectionState(queue=asyncio.Queue(maxsize=self.QUEUE_SIZE))
+        state.writer = asyncio.create_task(self._writer(websocket, state.queue))
+        self.active_connections.add(websocket)
+        self._states[websocket] = state
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
+        state = self._states.pop(websocket, None)
+        if state and state.writer and state.writer is not asyncio.current_task():
+            state.writer.cancel()
+
+    async def _writer(self, websocket: WebSocket, queue: asyncio.Queue):
+        """Drain a client's queue so a slow peer only delays itself."""
+        try:
+            while True:
+                payload = await queue.get()
+                await websocket.send_text(payload)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            self.disconnect(websocket)
 
     async def broadcast(self, message: dict):
-        """Broadcast message to all connected clients."""
-        for connection in self.active_connections:
+        """Queue a message for all connected clients.
+
+        Messages are coalesced for FLUSH_INTERVAL seconds (or MAX_BATCH items).
+        A lone message is sent as a JSON object frame, as before batching;
+        when several arrive in one window they are sent as one JSON array frame.
+        """
+        if not self._states:
+            return
+
+        self._pending.append(message)
+        if len(self._pending) >= self.MAX_BATCH:
+            self._flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        """Flush pending messages after the coalescing window."""
+        await asyncio.sleep(self.FLUSH_INTERVAL)
+        self._flush_task = None
+        self._flush()
+
+    def _flush(self):
+        """Serialize pending messages once and enqueue for each client's writer."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        payload = orjson.dumps(batch[0] if len(batch) == 1 else batch, default=str).decode("utf-8")
+        dead = []
+        for websocket, state in self._states.items():
+            if state.writer.done():
+                dead.append(websocket)
+                continue
             try:
-                await connection.send_json(message)
-            except Exception:
-                pass
+                state.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Drop the oldest message for backpressured clients
+                state.queue.get_nowait()
+                state.queue.put_nowait(payload)
+
+        for websocket in dead:
+            self.disconnect(websocket)
 
 
 ws_manager = ConnectionManager()
@@ -292,7 +415,11 @@ ws_manager = ConnectionManager()
 
 @router.websocket("/ws/logs")
 async def websocket_logs(websocket: WebSocket):
-    """WebSocket endpoint for real-time logs."""
+    """WebSocket endpoint for real-time logs.
+
+    Each frame is one log object, or a JSON array of log objects when
+    several were broadcast within the same coalescing window.
+    """
     await ws_manager.connect(websocket)
     try:
         while True:
@@ -312,7 +439,7 @@ async def broadcast_log(log_type: str, message: str, **extra):
     await ws_manager.broadcast({
         "type": log_type,
         "message": message,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(),
         **extra
     })
 
@@ -324,7 +451,7 @@ async def health_check():
     """Health check endpoint."""
     return {
         "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(),
         "version": "0.1.0"
     }
 
@@ -342,49 +469,52 @@ async def get_daily_request_stats(days: int = 365, user_id: Optional[int] = None
     Returns:
         List of daily request counts with dates
     """
-    end_date = datetime.now()
+    end_date = date.today()
     start_date = end_date - timedelta(days=days)
-    
-    start_date_str = start_date.strftime("%Y-%m-%d")
-    end_date_str = end_date.strftime("%Y-%m-%d")
-    
+
+    start_date_str = start_date.isoformat()
+    end_date_str = end_date.isoformat()
+
     try:
-        # Get all dates in range with counts (including zeros)
-        cursor = await db._conn.execute(
-            """
-            WITH RECURSIVE dates(date) AS (
-                SELECT ?
-                UNION ALL
-                SELECT date(date, '+1 day')
-                FROM dates
-                WHERE date < ?
-            )
-            SELECT 
-                d.date,
-                COALESCE(SUM(drc.request_count), 0) as count
-            FROM dates d
-            LEFT JOIN daily_request_counts drc ON d.date = drc.date
-                AND (? IS NULL OR drc.user_id = ?)
-            GROUP BY d.date
-            ORDER BY d.date ASC
-            """,
-            (start_date_str, end_date_str, user_id, user_id)
-        )
-        rows = await cursor.fetchall()
-        
-        # Format data for heatmap
+        # Single indexed range scan; missing dates are filled in below
+        async with db.acquire() as conn:
+            if user_id is None:
+                cursor = await conn.execute(
+                    """
+                    SELECT date, SUM(request_count)
+                    FROM daily_request_counts
+                    WHERE date BETWEEN ? AND ?
+                    GROUP BY date
+                    """,
+                    (start_date_str, end_date_str)
+                )
+            else:
+                cursor = await conn.execute(
+                    """
+                    SELECT date, SUM(request_count)
+                    FROM daily_request_counts
+                    WHERE date BETWEEN ? AND ? AND user_id = ?
+                    GROUP BY date
+                    """,
+                    (start_date_str, end_date_str, user_id)
+                )
+            counts = {row[0]: row[1] for row in await cursor.fetchall()}
+
+        # Format data for heatmap (including zero days) and compute stats in one pass
         data = []
-        for row in rows:
-            data.append({
-                "date": row[0],
-                "count": row[1]
-            })
-        
-        # Calculate statistics
-        total_requests = sum(item["count"] for item in data)
-        active_days = sum(1 for item in data if item["count"] > 0)
-        max_count = max((item["count"] for item in data), default=0)
-        
+        total_requests = 0
+        active_days = 0
+        max_count = 0
+        for i in range(days + 1):
+            day = (start_date + timedelta(days=i)).isoformat()
+            count = counts.get(day, 0)
+            data.append({"date": day, "count": count})
+            if count:
+                total_requests += count
+                active_days += 1
+                if count > max_count:
+                    max_count = count
+
         return {
             "data": data,
             "total_requests": total_requests,
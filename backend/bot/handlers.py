@@ -1,19 +1,25 @@
 """Telegram bot command handlers."""
 
 import asyncio
+import heapq
 import html
+import io
 import logging
 import os
+import re
 import time
+from collections import deque
+from functools import lru_cache
+from operator import attrgetter
 from pathlib import Path
-from typing import Optional, TYPE_CHECKING
+from typing import Awaitable, Callable, Deque, Dict, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from backend.claude.runner import ClaudeRunner
     from backend.claude.session import SessionContext
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CommandHandler,
     MessageHandler,
@@ -22,22 +28,17 @@ from telegram.ext import (
     filters,
 )
 from telegram.constants import ParseMode, ChatAction
+from telegram.error import BadRequest, RetryAfter
 
 from backend.config import settings
-from backend.bot.middleware import require_auth, admin_only
-from backend.claude.runner import runner_manager, StreamEvent, RunnerState
+from backend.bot.middleware import require_auth
+from backend.claude.runner import runner_manager, RunnerState
 from backend.claude.session import session_manager, SessionState
 from backend.claude.providers import get_llm_provider
-from backend.memory.manager import memory_manager
-from backend.db.models import db
 
 logger = logging.getLogger(__name__)
 
 
-# Minimum interval between message updates (seconds) to avoid Telegram rate limits
-MIN_UPDATE_INTERVAL = 1.0
-
-
 class StreamingMessageUpdater:
     """
     Manages streaming message updates to Telegram with rate limiting and batching.
@@ -49,15 +50,50 @@ class StreamingMessageUpdater:
     - Error recovery
     """
 
-    def __init__(self, message, min_update_interval: float = MIN_UPDATE_INTERVAL):
+    __slots__ = (
+        'message', 'min_update_interval', 'last_update_time',
+        '_chunks', '_len', '_sent_len', '_head', '_last_sent_text',
+        '_flush_handle', '_flush_task', '_flush_lock', '_closed',
+        'sent_message', 'update_count', 'error_count',
+    )
+
+    def __init__(self, message, min_update_interval: Optional[float] = None, sent_message=None):
+        """
+        Args:
+            message: Message to reply to when the stream starts
+            min_update_interval: Seconds between timed flushes
+            sent_message: Existing bot message (e.g. a placeholder) to edit
+                instead of sending a new one
+        """
         self.message = message
-        self.min_update_interval = min_update_interval
+        self.min_update_interval = (
+            MIN_UPDATE_INTERVAL if min_update_interval is None else min_update_interval
+        )
         self.last_update_time = 0
-        self.buffer = ""
-        self.sent_message = None
+        self._chunks: list[str] = []
+        self._len = 0
+        self._sent_len = 0  # Buffer length as of the last successful send
+        # Head kept by smart_truncate; stable once the buffer overflows since
+        # streaming only appends
+        self._head: Optional[str] = None
+        self._last_sent_text: Optional[str] = None
+        # Pending timed flush; at most one is armed at a time
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        # Set by finalize; later flushes must not overwrite the final edit
+        self._closed = False
+        self.sent_message = sent_message
         self.update_count = 0
         self.error_count = 0
 
+    @property
+    def buffer(self) -> str:
+        """Full accumulated text, joined on demand."""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
     async def append(self, text: str, force: bool = False):
         """
         Append text to buffer and potentially update the message.
@@ -66,50 +102,95 @@ class StreamingMessageUpdater:
             text: Text to append
             force: Force immediate update regardless of interval
         """
-        self.buffer += text
-        current_time = time.time()
-
-        # Determine if we should update
-        should_update = (
-            force
-            or len(self.buffer) >= STREAM_BUFFER_SIZE
-            or (current_time - self.last_update_time) >= self.min_update_interval
-        )
+        self._chunks.append(text)
+        self._len += len(text)
 
-        if should_update:
+        # Update now once enough unsent text has piled up; otherwise make
+        # sure a timed flush is pending so the message still advances
+        if force or self._len - self._sent_len >= STREAM_BUFFER_SIZE:
             await self.flush()
+        elif self._flush_handle is None:
+            self._schedule_flush(self.min_update_interval)
 
-    async def flush(self):
-        """Send/update the current buffer content."""
-        if not self.buffer:
+    def _schedule_flush(self, delay: float):
+        """Arm a timer that flushes the buffer after delay seconds."""
+        if self._closed:
             return
+        self._flush_handle = asyncio.get_running_loop().call_later(
+            delay, self._start_flush
+        )
+
+    def _start_flush(self):
+        """Timer callback: run flush as a task."""
+        self._flush_handle = None
+        self._flush_task = asyncio.create_task(self.flush())
 
-        current_time = time.time()
+    def _cancel_flush(self):
+        """Disarm the pending flush timer, if any."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
 
-        # Avoid too frequent updates
-        time_since_last = current_time - self.last_update_time
-        if time_since_last < 0.5 and self.update_count > 0:
+    async def flush(self, force: bool = False):
+        """Send/update the current buffer content."""
+        if not self._len or self._closed:
             return
 
+        async with self._flush_lock:
+            # finalize may have run while this flush waited for the lock
+            if self._closed:
+                return
+            current_time = asyncio.get_running_loop().time()
+
+            # Avoid too frequent updates; retry once the window has passed
+            time_since_last = current_time - self.last_update_time
+            if not force and time_since_last < 0.5 and self.update_count > 0:
+                if self._flush_handle is None:
+                    self._schedule_flush(0.5 - time_since_last)
+                return
+
+            self._cancel_flush()
+            try:
+                await self._send(current_time)
+            except RetryAfter as e:
+                # Flood control: try again once Telegram allows it
+                self._schedule_flush(_retry_after_seconds(e))
+
+    async def _send(self, current_time: float, footer: str = "", reply_markup=None, html: bool = False):
+        """Push the (truncated) buffer, plus an optional footer, to Telegram."""
+        buf = self.buffer
         try:
-            truncated = smart_truncate(self.buffer)
+            if footer:
+                truncated = smart_truncate(buf, MAX_MESSAGE_LENGTH - len(footer)) + footer
+            else:
+                truncated = self._truncate(buf)
+            # Telegram rejects edits that don't change the text
+            if truncated == self._last_sent_text and reply_markup is None:
+                return
 
             if self.sent_message is None:
                 # First message - send it
-                self.sent_message = await self.message.reply_text(truncated)
+                self.sent_message = await self._post(
+                    self.message.reply_text, truncated, reply_markup, html
+                )
             else:
                 # Update existing message
                 try:
-                    await self.sent_message.edit_text(truncated)
+                    await self._post(self.sent_message.edit_text, truncated, reply_markup, html)
+                except RetryAfter:
+                    raise
                 except Exception as edit_error:
-                    # If edit fails (message unchanged, etc.), log but continue
-                    if "Message is not modified" not in str(edit_error):
-                        logger.debug(f"Edit failed: {edit_error}")
+                    # If edit fails, log but continue
+                    logger.debug(f"Edit failed: {edit_error}")
+            self._last_sent_text = truncated
+            self._sent_len = len(buf)
 
             self.last_update_time = current_time
             self.update_count += 1
             self.error_count = 0  # Reset error count on success
 
+        except RetryAfter:
+            raise
         except Exception as e:
             self.error_count += 1
             logger.error(f"Failed to update message (attempt {self.error_count}): {e}")
@@ -118,34 +199,161 @@ class StreamingMessageUpdater:
             if self.error_count >= 3:
                 try:
                     await self.message.reply_text(
-                        f"⚠️ Update error. Continuing...\n\n{smart_truncate(self.buffer)}"
+                        f"⚠️ Update error. Continuing...\n\n{self._truncate(buf)}"
                     )
                     self.error_count = 0
                 except Exception:
                     pass
 
-    async def finalize(self):
-        """Send final update with all remaining content."""
-        await self.flush()
+    async def _post(self, method, text: str, reply_markup=None, html: bool = False):
+        """Call reply_text/edit_text, as HTML if asked, falling back to plain text if rejected."""
+        if html:
+            try:
+                return await method(
+                    markdown_to_html(text), reply_markup=reply_markup, parse_mode=ParseMode.HTML
+                )
+            except BadRequest as e:
+                logger.debug(f"HTML rendering rejected, sending plain text: {e}")
+        return await method(text, reply_markup=reply_markup)
+
+    async def show_status(self, text: str):
+        """Show a status line in the placeholder if no output has arrived yet."""
+        async with self._flush_lock:
+            if self._len or self.update_count or self.sent_message is None:
+                return
+            try:
+                await self.sent_message.edit_text(text)
+            except Exception as e:
+                logger.debug(f"Status edit failed: {e}")
+
+    def _stop_flushes(self):
+        """Make pending and future flushes no-ops."""
+        self._closed = True
+        self._cancel_flush()
+
+    async def close(self):
+        """Stop streaming edits, waiting out one in flight, so the message can be reused."""
+        self._stop_flushes()
+        async with self._flush_lock:
+            pass
+
+    def _truncate(self, buf: str) -> str:
+        """smart_truncate the buffer, reusing the head computed on overflow."""
+        if len(buf) <= MAX_MESSAGE_LENGTH:
+            return buf
+        if self._head is None:
+            self._head = _truncate_head(buf, (MAX_MESSAGE_LENGTH - 200) // 2)
+        return smart_truncate(buf, start_text=self._head)
+
+    async def finalize(self, footer: str = "", reply_markup=None, html: bool = False):
+        """
+        Send final update with all remaining content.
+
+        A footer and reply_markup, if given, ride along on this last edit
+        instead of costing a separate message. With html, the final text's
+        Markdown is rendered; streamed edits before it stay plain text.
+        """
+        # Stop timed flushes first: one already waiting on the lock would
+        # otherwise run after this edit and strip the footer and keyboard
+        self._stop_flushes()
+        if not self._len and not footer:
+            return
+
+        async with self._flush_lock:
+            loop = asyncio.get_running_loop()
+            # The final edit carries the footer, so wait out flood control once
+            for _ in range(2):
+                try:
+                    await self._send(loop.time(), footer, reply_markup, html)
+                    break
+                except RetryAfter as e:
+                    delay = _retry_after_seconds(e)
+                    logger.warning(f"Flood control on final update, retrying in {delay:.0f}s")
+                    await asyncio.sleep(delay)
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    """Seconds to wait from a RetryAfter, which may carry an int or a timedelta."""
+    retry_after = error.retry_after
+    if hasattr(retry_after, "total_seconds"):
+        return retry_after.total_seconds()
+    return float(retry_after)
 
 
 # Maximum message length for Telegram
 MAX_MESSAGE_LENGTH = 4096
 # Minimum update interval to avoid rate limits (seconds)
 MIN_UPDATE_INTERVAL = 1.5
-# Buffer size for streaming updates (characters)
+# Unsent characters that trigger an immediate streaming update
 STREAM_BUFFER_SIZE = 200
+# Seconds without streamed output before the placeholder shows a status line
+STATUS_DELAY = 0.5
+
+
+# Telegram MarkdownV2 special characters, and a table escaping them in one pass
+_MD_SPECIAL = '_*[]()~`>#+-=|{}.!'
+_MD_ESCAPE = str.maketrans({c: f'\\{c}' for c in _MD_SPECIAL})
 
 
 def escape_markdown(text: str) -> str:
     """Escape special characters for Telegram MarkdownV2."""
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
+    return text.translate(_MD_ESCAPE)
 
 
-def smart_truncate(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> str:
+# Markdown that Claude commonly emits and Telegram HTML can show
+_CODE_BLOCK_RE = re.compile(r"```[^\n`]*\n?(.*?)```", re.DOTALL)
+_INLINE_CODE_RE = re.compile(r"`([^`\n]+)`")
+_BOLD_RE = re.compile(r"\*\*([^*\n]+)\*\*")
+
+
+def _inline_to_html(text: str) -> str:
+    """Escape text for Telegram HTML, rendering inline code and bold."""
+    parts = _INLINE_CODE_RE.split(text)
+    # Odd indexes are the captured code spans
+    for i, part in enumerate(parts):
+        part = html.escape(part, quote=False)
+        parts[i] = f"<code>{part}</code>" if i % 2 else _BOLD_RE.sub(r"<b>\1</b>", part)
+    return "".join(parts)
+
+
+def markdown_to_html(text: str) -> str:
+    """Convert fenced code, inline code and bold Markdown to Telegram HTML."""
+    parts = []
+    pos = 0
+    for match in _CODE_BLOCK_RE.finditer(text):
+        parts.append(_inline_to_html(text[pos:match.start()]))
+        parts.append(f"<pre>{html.escape(match.group(1), quote=False)}</pre>")
+        pos = match.end()
+    parts.append(_inline_to_html(text[pos:]))
+    return "".join(parts)
+
+
+# Marker inserted between the kept head and tail of a truncated message
+_TRUNC_NOTICE = "\n\n... [%d chars truncated] ...\n\n"
+
+
+def _truncate_head(text: str, half: int) -> str:
+    """Start portion kept by smart_truncate; depends only on text[:half]."""
+    last_para = text.rfind('\n\n', 0, half)
+    if last_para > half * 0.7:  # If we found a paragraph break in last 30%
+        return text[:last_para]
+    return text[:half]
+
+
+def _truncate_tail(text: str, half: int) -> str:
+    """End portion kept by smart_truncate."""
+    tail_start = max(len(text) - half, 0)
+    first_para = text.find('\n\n', tail_start) - tail_start
+    if 0 < first_para < half * 0.3:  # If found in first 30%
+        return text[tail_start + first_para + 2:]
+    return text[tail_start:]
+
+
+def smart_truncate(
+    text: str,
+    max_length: int = MAX_MESSAGE_LENGTH,
+    start_text: Optional[str] = None,
+) -> str:
     """
     Intelligently truncate message, preserving code blocks and structure.
 
@@ -153,6 +361,9 @@ def smart_truncate(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> str:
     1. Keep complete code blocks
     2. Break at paragraph boundaries
     3. Preserve important information at start and end
+
+    A previously computed start_text may be passed in when text has only
+    been appended to since, skipping the rescan of the head.
     """
     if len(text) <= max_length:
         return text
@@ -164,24 +375,13 @@ def smart_truncate(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> str:
     # Prefer breaking at double newline (paragraph)
     half = available // 2
 
-    # Get start portion
-    start_text = text[:half]
-    last_para = start_text.rfind('\n\n')
-    if last_para > half * 0.7:  # If we found a paragraph break in last 30%
-        start_text = text[:last_para]
-
-    # Get end portion
-    end_text = text[-half:]
-    first_para = end_text.find('\n\n')
-    if first_para > 0 and first_para < half * 0.3:  # If found in first 30%
-        end_text = end_text[first_para + 2:]
-    else:
-        end_text = text[-half:]
+    if start_text is None:
+        start_text = _truncate_head(text, half)
+    end_text = _truncate_tail(text, half)
 
     truncated_chars = len(text) - len(start_text) - len(end_text)
-    notice = f"\n\n... [{truncated_chars} chars truncated] ...\n\n"
 
-    return start_text + notice + end_text
+    return start_text + _TRUNC_NOTICE % truncated_chars + end_text
 
 
 async def send_long_message(update: Update, text: str, parse_mode: Optional[str] = None):
@@ -192,38 +392,39 @@ async def send_long_message(update: Update, text: str, parse_mode: Optional[str]
 
     # Smart chunking that respects code blocks and paragraphs
     chunks = []
-    current = ""
+    current: list[str] = []
+    current_len = 0  # Length of "\n".join(current)
     in_code_block = False
+    limit = MAX_MESSAGE_LENGTH - 100
 
     for line in text.split("\n"):
+        # If adding this line exceeds limit, start a new chunk
+        if current and current_len + len(line) + 1 > limit:
+            # If we're in a code block, close it here and reopen it in the next chunk
+            if in_code_block:
+                current.append("```")
+            chunks.append("\n".join(current))
+            current = ["```"] if in_code_block else []
+            current_len = 3 if in_code_block else 0
+
+        current_len += len(line) + 1 if current else len(line)
+        current.append(line)
+
         # Track code blocks
         if line.strip().startswith("```"):
             in_code_block = not in_code_block
 
-        potential_length = len(current) + len(line) + 1
-
-        # If adding this line exceeds limit
-        if potential_length > MAX_MESSAGE_LENGTH - 100:
-            # If we're in a code block, try to close it
-            if in_code_block:
-                current += "\n```"
-                in_code_block = False
-            chunks.append(current)
-            # If we just closed a code block, open it again in next chunk
-            current = "```\n" + line if in_code_block else line
-        else:
-            current = current + "\n" + line if current else line
-
     if current:
-        chunks.append(current)
+        chunks.append("\n".join(current))
 
-    # Send all chunks
+    # Send chunks one after another so parts arrive in order; the
+    # application's rate limiter handles flood control, so no sleep between them
+    total = len(chunks)
     for i, chunk in enumerate(chunks):
-        prefix = f"📄 Part {i+1}/{len(chunks)}\n\n" if len(chunks) > 1 else ""
-        await update.message.reply_text(prefix + chunk, parse_mode=parse_mode)
-        # Add small delay to avoid rate limits
-        if i < len(chunks) - 1:
-            await asyncio.sleep(0.3)
+        await update.message.reply_text(
+            (f"📄 Part {i+1}/{total}\n\n" if total > 1 else "") + chunk,
+            parse_mode=parse_mode
+        )
 
 
 # ============ Helper Functions ============
@@ -260,67 +461,195 @@ def get_or_create_runner(user_id: int, session = None):
 
 # ============ Command Handlers ============
 
+def _list_dir(
+    path: Path, max_dirs: int, max_files: int
+) -> tuple[list[os.DirEntry], list[os.DirEntry], int, int]:
+    """Read a directory once, returning the first dirs and files by name plus their totals."""
+    dirs, files = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                dirs.append(entry)
+            elif entry.is_file():
+                files.append(entry)
+    # Only the head of each listing is shown, so avoid sorting the whole directory
+    by_name = attrgetter("name")
+    return (
+        heapq.nsmallest(max_dirs, dirs, key=by_name),
+        heapq.nsmallest(max_files, files, key=by_name),
+        len(dirs),
+        len(files),
+    )
+
+
+def _ls_lines(path: Path) -> list[str]:
+    """Build the /ls listing for path."""
+    dirs, files, dir_count, file_count = _list_dir(path, 20, 30)
+
+    lines = [f"📂 `{path}`\n"]
+
+    if dirs:
+        lines.append("**Directories:**")
+        for d in dirs:
+            lines.append(f"  📁 {d.name}/")
+
+    if files:
+        lines.append("\n**Files:**")
+        for f in files:
+            size = f.stat().st_size
+            size_str = f"{size}B" if size < 1024 else f"{size//1024}KB"
+            lines.append(f"  📄 {f.name} ({size_str})")
+
+    if dir_count > 20 or file_count > 30:
+        lines.append(f"\n... and more ({dir_count} dirs, {file_count} files total)")
+
+    return lines
+
+
+def _build_tree(path: Path, max_depth: int, prefix: str = "", depth: int = 0) -> list[str]:
+    """Recursively build directory tree."""
+    if depth > max_depth:
+        return []
+
+    lines = []
+    try:
+        with os.scandir(path) as it:
+            all_entries = sorted(it, key=lambda x: (not x.is_dir(), x.name))
+        # Limit entries to prevent huge output
+        entries = all_entries[:50]
+
+        for i, entry in enumerate(entries):
+            is_last = i == len(entries) - 1
+            current_prefix = "└── " if is_last else "├── "
+            next_prefix = "    " if is_last else "│   "
+
+            if entry.is_dir():
+                lines.append(f"{prefix}{current_prefix}📁 {entry.name}/")
+                if depth < max_depth:
+                    lines.extend(_build_tree(Path(entry.path), max_depth, prefix + next_prefix, depth + 1))
+            else:
+                size = entry.stat().st_size
+                size_str = f"{size}B" if size < 1024 else f"{size//1024}KB"
+                lines.append(f"{prefix}{current_prefix}📄 {entry.name} ({size_str})")
+
+        if len(all_entries) > 50:
+            lines.append(f"{prefix}... (truncated)")
+
+    except PermissionError:
+        lines.append(f"{prefix}[Permission Denied]")
+
+    return lines
+
+
+def _scan_subdirs(path: Path, limit: int) -> list[Path]:
+    """Most recently modified non-hidden subdirectories of path."""
+    with os.scandir(path) as it:
+        entries = heapq.nlargest(
+            limit,
+            (e for e in it if e.is_dir() and not e.name.startswith('.')),
+            key=lambda e: e.stat().st_mtime,
+        )
+    return [Path(e.path) for e in entries]
+
+
+# Keyboards are immutable once built, so share a single instance of each
+_MAIN_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🆕 New Session", callback_data="menu:new"),
+        InlineKeyboardButton("▶️ Continue", callback_data="menu:continue"),
+    ],
+    [
+        InlineKeyboardButton("📂 Folders", callback_data="menu:show_dirs"),
+        InlineKeyboardButton("📍 PWD", callback_data="menu:pwd"),
+        InlineKeyboardButton("📊 Status", callback_data="menu:status"),
+    ],
+    [
+        InlineKeyboardButton("📋 Sessions", callback_data="menu:sessions"),
+        InlineKeyboardButton("💾 Export", callback_data="menu:export"),
+        InlineKeyboardButton("🛑 End", callback_data="menu:end"),
+    ],
+])
+
+_QUICK_ACTIONS_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🔍 Review Code", callback_data="quick:review"),
+        InlineKeyboardButton("🐛 Debug", callback_data="quick:debug"),
+    ],
+    [
+        InlineKeyboardButton("📝 Explain", callback_data="quick:explain"),
+        InlineKeyboardButton("✨ Improve", callback_data="quick:improve"),
+    ],
+    [
+        InlineKeyboardButton("🧪 Write Tests", callback_data="quick:tests"),
+        InlineKeyboardButton("📖 Add Docs", callback_data="quick:docs"),
+    ],
+    [
+        InlineKeyboardButton("📂 Menu", callback_data="menu:show"),
+    ],
+])
+
+
+_NEW_SESSION_KEYBOARD = InlineKeyboardMarkup([[
+    InlineKeyboardButton("🆕 New Session", callback_data="menu:new")
+]])
+
+_SHOW_DIRS_KEYBOARD = InlineKeyboardMarkup([[
+    InlineKeyboardButton("📂 Show Dirs", callback_data="menu:show_dirs")
+]])
+
+_STOP_KEYBOARD = InlineKeyboardMarkup([[
+    InlineKeyboardButton("🛑 Stop", callback_data="menu:stop_task")
+]])
+
+_COMPLETION_KEYBOARD = InlineKeyboardMarkup([[
+    InlineKeyboardButton("⚡ Quick Actions", callback_data="show:actions"),
+    InlineKeyboardButton("📋 Menu", callback_data="menu:show")
+]])
+
+_ERROR_KEYBOARD = InlineKeyboardMarkup([[
+    InlineKeyboardButton("🆕 New Session", callback_data="menu:new"),
+    InlineKeyboardButton("📊 Status", callback_data="menu:status")
+]])
+
+
 def get_main_menu_keyboard():
     """Get main menu inline keyboard."""
-    return InlineKeyboardMarkup([
-        [
-            InlineKeyboardButton("🆕 New Session", callback_data="menu:new"),
-            InlineKeyboardButton("▶️ Continue", callback_data="menu:continue"),
-        ],
-        [
-            InlineKeyboardButton("📂 Folders", callback_data="menu:show_dirs"),
-            InlineKeyboardButton("📍 PWD", callback_data="menu:pwd"),
-            InlineKeyboardButton("📊 Status", callback_data="menu:status"),
-        ],
-        [
-            InlineKeyboardButton("📋 Sessions", callback_data="menu:sessions"),
-            InlineKeyboardButton("💾 Export", callback_data="menu:export"),
-            InlineKeyboardButton("🛑 End", callback_data="menu:end"),
-        ],
-    ])
+    return _MAIN_MENU_KEYBOARD
 
 
 def get_quick_actions_keyboard():
     """Get quick actions keyboard for common coding tasks."""
-    return InlineKeyboardMarkup([
-        [
-            InlineKeyboardButton("🔍 Review Code", callback_data="quick:review"),
-            InlineKeyboardButton("🐛 Debug", callback_data="quick:debug"),
-        ],
-        [
-            InlineKeyboardButton("📝 Explain", callback_data="quick:explain"),
-            InlineKeyboardButton("✨ Improve", callback_data="quick:improve"),
-        ],
-        [
-            InlineKeyboardButton("🧪 Write Tests", callback_data="quick:tests"),
-            InlineKeyboardButton("📖 Add Docs", callback_data="quick:docs"),
-        ],
-        [
-            InlineKeyboardButton("📂 Menu", callback_data="menu:show"),
-        ],
-    ])
-
+    return _QUICK_ACTIONS_KEYBOARD
 
-@require_auth
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /start command."""
-    user = update.effective_user
 
-    # Get provider info
+@lru_cache(maxsize=1)
+def _welcome_body() -> str:
+    """Welcome text after the greeting; the provider is fixed for the process."""
     provider = get_llm_provider()
     provider_name = provider.get_name() if provider else "Claude CLI (Pro)"
-
-    await update.message.reply_text(
-        f"👋 Welcome, {user.first_name}!\n\n"
-        f"🤖 **ccBot** - Claude Code in Telegram\n"
+    return (
+        "\n\n🤖 **ccBot** - Claude Code in Telegram\n"
         f"🔌 Provider: {provider_name}\n\n"
         "💡 Tap the **Menu** button (bottom left) for commands.\n"
-        "Or select an action below:",
+        "Or select an action below:"
+    )
+
+
+async def _send_welcome(update: Update):
+    """Reply with the welcome message and main menu."""
+    await update.message.reply_text(
+        f"👋 Welcome, {update.effective_user.first_name}!" + _welcome_body(),
         parse_mode="Markdown",
         reply_markup=get_main_menu_keyboard()
     )
 
 
+@require_auth
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /start command."""
+    await _send_welcome(update)
+
+
 @require_auth
 async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /menu command - show quick menu."""
@@ -344,7 +673,7 @@ async def actions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @require_auth
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command."""
-    await start_command(update, context)
+    await _send_welcome(update)
 
 
 @require_auth
@@ -400,13 +729,11 @@ async def sessions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     lines = ["**Your Sessions:**\n"]
-    for s in sessions[:10]:
-        status = "🟢" if s.state == SessionState.IDLE else "🔄"
-        title = s.title or "Untitled"
-        lines.append(
-            f"{status} `{s.session_id}` - {title}\n"
-            f"   📁 {s.working_directory.name} | 💬 {len(s.messages)} msgs"
-        )
+    lines.extend(
+        f"{'🟢' if s.state == SessionState.IDLE else '🔄'} `{s.session_id}` - {s.title or 'Untitled'}\n"
+        f"   📁 {s.working_directory.name} | 💬 {len(s.messages)} msgs"
+        for s in sessions[:10]
+    )
 
     # Add buttons for session selection
     keyboard = [
@@ -421,6 +748,14 @@ async def sessions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+_DIRS_USAGE = (
+    "\n💡 **Usage:**\n"
+    "• `/cd <folder>` - Switch to folder\n"
+    "• `/cd ..` - Go up one level\n"
+    "• `/pwd` - Show current path"
+)
+
+
 @require_auth
 async def dirs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /dirs command - list and quick switch directories."""
@@ -433,18 +768,10 @@ async def dirs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Get all subdirectories in approved directory
         subdirs = []
         if approved_dir.exists():
-            subdirs = [d for d in approved_dir.iterdir() if d.is_dir() and not d.name.startswith('.')]
-            subdirs = sorted(subdirs, key=lambda x: x.stat().st_mtime, reverse=True)[:10]
+            subdirs = await asyncio.to_thread(_scan_subdirs, approved_dir, 10)
 
         # Get recent directories from sessions
-        sessions = session_manager.get_user_sessions(user_id)
-        recent_dirs = []
-        seen = set()
-        for s in sessions:
-            dir_path = str(s.working_directory)
-            if dir_path not in seen:
-                recent_dirs.append(s.working_directory)
-                seen.add(dir_path)
+        recent_dirs = session_manager.get_recent_directories(user_id)
 
         # Build message
         lines = ["📂 **Available Directories**\n"]
@@ -453,27 +780,27 @@ async def dirs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         session = session_manager.get_active_session(user_id)
         runner = runner_manager.get_active_runner(session.session_id) if session else None
         current_dir = runner.working_directory if runner else settings.approved_directory_path
-        lines.append(f"**Current:** `{current_dir}`\n")
+        current_dir_str = str(current_dir)
+        lines.append(f"**Current:** `{current_dir_str}`\n")
 
         # Recent directories
         if recent_dirs:
             lines.append("**Recently Used:**")
-            for i, d in enumerate(recent_dirs[:5], 1):
-                is_current = "👉 " if str(d) == str(current_dir) else "   "
-                lines.append(f"{is_current}{i}. `{d.name}/`")
+            lines.extend(
+                f"{'👉 ' if str(d) == current_dir_str else '   '}{i}. `{d.name}/`"
+                for i, d in enumerate(recent_dirs[:5], 1)
+            )
             lines.append("")
 
         # Available subdirectories
         if subdirs:
             lines.append("**Available in Workspace:**")
-            for d in subdirs[:8]:
-                is_current = "👉 " if str(d) == str(current_dir) else "   "
-                lines.append(f"{is_current}📁 `{d.name}/`")
+            lines.extend(
+                f"{'👉 ' if str(d) == current_dir_str else '   '}📁 `{d.name}/`"
+                for d in subdirs[:8]
+            )
 
-        lines.append(f"\n💡 **Usage:**")
-        lines.append(f"• `/cd <folder>` - Switch to folder")
-        lines.append(f"• `/cd ..` - Go up one level")
-        lines.append(f"• `/pwd` - Show current path")
+        lines.append(_DIRS_USAGE)
 
         # Create quick switch buttons for recent dirs
         keyboard = []
@@ -537,7 +864,7 @@ async def cd_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if runner.change_directory(path):
         if session:
-            session.working_directory = runner.working_directory
+            session.set_working_directory(runner.working_directory)
 
         await update.message.reply_text(
             f"✅ Changed to: `{runner.working_directory}`\n\n"
@@ -567,27 +894,7 @@ async def ls_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        entries = list(runner.working_directory.iterdir())
-        dirs = sorted([e for e in entries if e.is_dir()], key=lambda x: x.name)
-        files = sorted([e for e in entries if e.is_file()], key=lambda x: x.name)
-
-        lines = [f"📂 `{runner.working_directory}`\n"]
-
-        if dirs:
-            lines.append("**Directories:**")
-            for d in dirs[:20]:
-                lines.append(f"  📁 {d.name}/")
-
-        if files:
-            lines.append("\n**Files:**")
-            for f in files[:30]:
-                size = f.stat().st_size
-                size_str = f"{size}B" if size < 1024 else f"{size//1024}KB"
-                lines.append(f"  📄 {f.name} ({size_str})")
-
-        if len(dirs) > 20 or len(files) > 30:
-            lines.append(f"\n... and more ({len(dirs)} dirs, {len(files)} files total)")
-
+        lines = await asyncio.to_thread(_ls_lines, runner.working_directory)
         await send_long_message(update, "\n".join(lines), parse_mode="Markdown")
 
     except Exception as e:
@@ -625,22 +932,25 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         provider_info = "🔌 Provider: Claude CLI (Interactive)"
 
-    lines = ["**Status:**\n"]
-    lines.append(provider_info)
+    lines = ["**Status:**\n", provider_info]
 
     if runner:
-        lines.append(f"🤖 Runner: {runner.state.value}")
-        lines.append(f"🔄 Process: {'alive' if runner.is_alive else 'stopped'}")
-        lines.append(f"📂 Directory: `{runner.working_directory}`")
+        lines += [
+            f"🤖 Runner: {runner.state.value}",
+            f"🔄 Process: {'alive' if runner.is_alive else 'stopped'}",
+            f"📂 Directory: `{runner.working_directory}`",
+        ]
     else:
         lines.append("🤖 Runner: Not started yet")
 
     if session:
-        lines.append(f"\n**Session:** `{session.session_id}`")
-        lines.append(f"💬 Messages: {len(session.messages)}")
-        lines.append(f"💰 Cost: ${session.total_cost:.4f}")
-        lines.append(f"📊 State: {session.state.value}")
-        if runner.session_id:
+        lines += [
+            f"\n**Session:** `{session.session_id}`",
+            f"💬 Messages: {len(session.messages)}",
+            f"💰 Cost: ${session.total_cost:.4f}",
+            f"📊 State: {session.state.value}",
+        ]
+        if runner and runner.session_id:
             lines.append(f"🔗 Claude Session: `{runner.session_id[:8]}...`")
 
     # Tip for cost check
@@ -655,11 +965,21 @@ async def stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
     session = session_manager.get_active_session(user_id)
-    if session:
-        await runner_manager.stop_runner(session.session_id, user_id)
-        session_manager.update_session_state(session.session_id, SessionState.IDLE)
+    reply = update.message.reply_text("🛑 Stopped current task.")
+    if not session:
+        await reply
+        return
 
-    await update.message.reply_text("🛑 Stopped current task.")
+    # The reply doesn't depend on the process exiting, so send it while the runner stops
+    await asyncio.gather(runner_manager.stop_runner(session.session_id, user_id), reply)
+    session_manager.update_session_state(session.session_id, SessionState.IDLE)
+
+
+_END_RESPONSE_TEMPLATE = (
+    "✅ Session `{sid}` ended and saved.\n"
+    "💬 {msgs} messages\n"
+    "💰 Cost: ${cost:.4f}\n"
+)
 
 
 @require_auth
@@ -680,6 +1000,7 @@ async def end_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await session_manager.save_session_to_file(session.session_id)
 
     # Extract user preferences and update USER.md
+    from backend.memory.manager import memory_manager
     messages_data = [
         {"role": m.role, "content": m.content}
         for m in session.messages
@@ -691,13 +1012,13 @@ async def end_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Clear active session
     session_manager.update_session_state(session.session_id, SessionState.IDLE)
-    session_manager._active_session.pop(user_id, None)
+    session_manager.clear_active(user_id)
 
     # Build response
-    response = (
-        f"✅ Session `{session.session_id}` ended and saved.\n"
-        f"💬 {len(session.messages)} messages\n"
-        f"💰 Cost: ${session.total_cost:.4f}\n"
+    response = _END_RESPONSE_TEMPLATE.format(
+        sid=session.session_id,
+        msgs=len(session.messages),
+        cost=session.total_cost
     )
 
     # Add profile update info
@@ -725,16 +1046,14 @@ async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("No active session to export.")
         return
 
-    markdown = session.to_markdown()
-
-    # Save to file
-    await session_manager.save_session_to_file(session.session_id)
+    # Save to file, keeping the rendered markdown for the reply
+    markdown = await session_manager.save_session_to_file(session.session_id)
 
-    # Send as document if too long
+    # Send as document if too long; the saved file holds the same markdown,
+    # so upload it from memory instead of reading it back
     if len(markdown) > MAX_MESSAGE_LENGTH:
-        filepath = settings.sessions_path / f"{session.session_id}.md"
         await update.message.reply_document(
-            document=open(filepath, "rb"),
+            document=io.BytesIO(markdown.encode("utf-8")),
             filename=f"session_{session.session_id}.md",
             caption=f"Session export: {session.session_id}"
         )
@@ -765,41 +1084,9 @@ async def tree_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
     try:
-        def build_tree(path: Path, prefix: str = "", depth: int = 0) -> list:
-            """Recursively build directory tree."""
-            if depth > max_depth:
-                return []
-
-            lines = []
-            try:
-                entries = sorted(path.iterdir(), key=lambda x: (not x.is_dir(), x.name))
-                # Limit entries to prevent huge output
-                entries = entries[:50]
-
-                for i, entry in enumerate(entries):
-                    is_last = i == len(entries) - 1
-                    current_prefix = "└── " if is_last else "├── "
-                    next_prefix = "    " if is_last else "│   "
-
-                    if entry.is_dir():
-                        lines.append(f"{prefix}{current_prefix}📁 {entry.name}/")
-                        if depth < max_depth:
-                            lines.extend(build_tree(entry, prefix + next_prefix, depth + 1))
-                    else:
-                        size = entry.stat().st_size
-                        size_str = f"{size}B" if size < 1024 else f"{size//1024}KB"
-                        lines.append(f"{prefix}{current_prefix}📄 {entry.name} ({size_str})")
-
-                if len(list(path.iterdir())) > 50:
-                    lines.append(f"{prefix}... (truncated)")
-
-            except PermissionError:
-                lines.append(f"{prefix}[Permission Denied]")
-
-            return lines
-
-        tree_lines = [f"📂 {runner.working_directory}", ""]
-        tree_lines.extend(build_tree(runner.working_directory))
+        root = runner.working_directory
+        tree_lines = [f"📂 {root}", ""]
+        tree_lines.extend(await asyncio.to_thread(_build_tree, root, max_depth))
 
         tree_text = "\n".join(tree_lines)
         await send_long_message(update, f"```\n{tree_text}\n```", parse_mode="Markdown")
@@ -825,8 +1112,7 @@ async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     cost = session.total_cost
 
     # Clear messages but keep session
-    session.messages.clear()
-    session.total_cost = 0
+    session.clear_history()
 
     await update.message.reply_text(
         f"🗑️ **Session History Cleared**\n\n"
@@ -843,17 +1129,15 @@ async def usage_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
     # Get local stats
-    sessions = session_manager.get_user_sessions(user_id)
-    total_cost = sum(s.total_cost for s in sessions)
-    total_messages = sum(len(s.messages) for s in sessions)
+    totals = session_manager.get_user_totals(user_id)
 
     # Build response
     response = (
         "📊 **Usage Information**\n\n"
         f"**Local Stats (This Bot):**\n"
-        f"• Total sessions: {len(sessions)}\n"
-        f"• Total messages: {total_messages}\n"
-        f"• Estimated cost: ${total_cost:.4f}\n\n"
+        f"• Total sessions: {totals.sessions}\n"
+        f"• Total messages: {totals.messages}\n"
+        f"• Estimated cost: ${totals.cost:.4f}\n\n"
         f"**View Full Claude Usage:**\n"
         f"🌐 Visit: https://claude.ai/settings/usage\n\n"
         f"_Note: The link shows your overall Claude Pro usage, "
@@ -872,27 +1156,23 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /stats command - show usage statistics."""
     user_id = update.effective_user.id
 
-    sessions = session_manager.get_user_sessions(user_id)
+    totals = session_manager.get_user_totals(user_id)
 
-    if not sessions:
+    if not totals.sessions:
         await update.message.reply_text("No session history yet.")
         return
 
-    total_messages = sum(len(s.messages) for s in sessions)
-    total_cost = sum(s.total_cost for s in sessions)
-    total_sessions = len(sessions)
+    total_messages = totals.messages
+    total_cost = totals.cost
+    total_sessions = totals.sessions
 
     # Calculate average
     avg_messages = total_messages / total_sessions if total_sessions > 0 else 0
     avg_cost = total_cost / total_sessions if total_sessions > 0 else 0
 
     # Find most used directory
-    dir_counts = {}
-    for s in sessions:
-        dir_name = str(s.working_directory)
-        dir_counts[dir_name] = dir_counts.get(dir_name, 0) + 1
-
-    most_used_dir = max(dir_counts.items(), key=lambda x: x[1])[0] if dir_counts else "N/A"
+    most_used_dir = totals.most_used_directory()
+    most_used_dir_name = most_used_dir.name if most_used_dir else "N/A"
 
     stats_text = (
         f"📊 **Your Statistics**\n\n"
@@ -903,7 +1183,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"  • Messages: {avg_messages:.1f}\n"
         f"  • Cost: ${avg_cost:.4f}\n\n"
         f"**Most Used Directory:**\n"
-        f"  `{Path(most_used_dir).name}/`"
+        f"  `{most_used_dir_name}/`"
     )
 
     await update.message.reply_text(stats_text, parse_mode="Markdown")
@@ -911,7 +1191,132 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ============ Message Handler ============
 
-async def _handle_with_claude_cli(message, text, session, user_id, context=None):
+# Seconds between typing indicators; Telegram shows one for about 5s
+TYPING_INTERVAL = 4
+
+# Footer appended to the final streamed edit of each completed turn
+COMPLETION_TEMPLATE = "\n\n✅ Task completed\n💬 Messages: {msgs}\n💰 Total cost: ${cost:.4f}"
+
+# Strong references to fire-and-forget tasks so they aren't collected mid-flight
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def _send_typing_action(bot, chat_id: int):
+    """Send a typing indicator, ignoring failures."""
+    try:
+        await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+    except Exception:
+        pass
+
+
+def _fire_and_forget(coro):
+    """Run a coroutine in the background, holding a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _spawn_typing(bot, chat_id: int, session: "SessionContext"):
+    """Send a typing indicator in the background and record when it was sent."""
+    session.last_typing_time = time.monotonic()
+    _fire_and_forget(_send_typing_action(bot, chat_id))
+
+
+def send_typing(context, chat_id: int, session: "SessionContext"):
+    """Show a typing indicator without blocking, at most once per TYPING_INTERVAL per session."""
+    if time.monotonic() - session.last_typing_time < TYPING_INTERVAL:
+        return
+    _spawn_typing(context.bot, chat_id, session)
+
+
+class TypingIndicator:
+    """Keep a typing indicator visible with a self re-arming timer until stopped."""
+
+    __slots__ = ("bot", "chat_id", "session", "_handle")
+
+    def __init__(self, context, chat_id: int, session: "SessionContext"):
+        self.bot = context.bot
+        self.chat_id = chat_id
+        self.session = session
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    def start(self):
+        """Arm the timer, firing immediately if the last indicator has expired."""
+        elapsed = time.monotonic() - self.session.last_typing_time
+        self._handle = asyncio.get_running_loop().call_later(
+            max(0.0, TYPING_INTERVAL - elapsed), self._tick
+        )
+
+    def _tick(self):
+        _spawn_typing(self.bot, self.chat_id, self.session)
+        self._handle = asyncio.get_running_loop().call_later(TYPING_INTERVAL, self._tick)
+
+    def stop(self):
+        """Cancel the pending indicator."""
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+
+
+class _CliTurn:
+    """State shared by the CLI event handlers for one turn."""
+
+    __slots__ = ("session", "runner", "updater", "owns_updater", "response_parts")
+
+    def __init__(self, session: "SessionContext", runner, updater: StreamingMessageUpdater, owns_updater: bool):
+        self.session = session
+        self.runner = runner
+        self.updater = updater
+        self.owns_updater = owns_updater
+        # Result texts are only a fallback for when nothing was streamed
+        self.response_parts: Deque[str] = deque(maxlen=32)
+
+
+async def _on_cli_text(event, turn: _CliTurn):
+    # Append text to streaming buffer
+    await turn.updater.append(event.content)
+
+
+async def _on_cli_tool_use(event, turn: _CliTurn):
+    # Add tool notification; it rides along with the next coalesced edit
+    await turn.updater.append(f"\n\n🔧 Using tool: {event.content}")
+
+
+async def _on_cli_result(event, turn: _CliTurn):
+    # Store session info
+    if event.metadata.get("session_id"):
+        turn.session.claude_session_id = event.metadata["session_id"]
+        turn.runner.session_id = event.metadata["session_id"]
+    if event.metadata.get("cost"):
+        cost = event.metadata["cost"]
+        session_manager.add_cost(turn.session.session_id, cost)
+        # Add cost info to message
+        await turn.updater.append(f"\n\n💰 Cost: ${cost:.4f}")
+    turn.response_parts.append(event.content)
+
+
+async def _on_cli_error(event, turn: _CliTurn):
+    await turn.updater.append(f"\n\n❌ Error: {event.content}", force=True)
+    logger.error(f"Claude CLI error: {event.content}")
+
+
+async def _on_cli_done(event, turn: _CliTurn):
+    # Final flush
+    if turn.owns_updater:
+        await turn.updater.finalize()
+
+
+# CLI stream event type -> handler
+_EVENT_HANDLERS: Dict[str, Callable[..., Awaitable[None]]] = {
+    "text": _on_cli_text,
+    "tool_use": _on_cli_tool_use,
+    "result": _on_cli_result,
+    "error": _on_cli_error,
+    "done": _on_cli_done,
+}
+
+
+async def _handle_with_claude_cli(message, text, session, user_id, context=None, updater=None):
     """Handle message using Claude CLI with optimized streaming."""
     runner = get_or_create_runner(user_id, session)
 
@@ -924,59 +1329,22 @@ async def _handle_with_claude_cli(message, text, session, user_id, context=None)
 
     continue_session = runner.session_id is not None
 
-    # Use the new streaming updater
-    updater = StreamingMessageUpdater(message)
-    response_parts = []
-    last_typing_time = time.time()
+    # Use the new streaming updater; a caller-supplied one is finalized by the caller
+    owns_updater = updater is None
+    updater = updater or StreamingMessageUpdater(message)
+    # Keep the typing indicator alive while the CLI runs
+    typing = TypingIndicator(context, message.chat_id, session) if context else None
+    turn = _CliTurn(session, runner, updater, owns_updater)
     event_count = 0
-    tool_uses = []
 
     try:
+        if typing:
+            typing.start()
         async for event in runner.run(text, continue_session=continue_session):
             event_count += 1
-
-            # Send typing indicator periodically
-            current_time = time.time()
-            if context and current_time - last_typing_time > 4:
-                try:
-                    await context.bot.send_chat_action(
-                        chat_id=message.chat_id,
-                        action=ChatAction.TYPING
-                    )
-                    last_typing_time = current_time
-                except Exception:
-                    pass
-
-            if event.type == "text":
-                # Append text to streaming buffer
-                await updater.append(event.content)
-
-            elif event.type == "tool_use":
-                tool_uses.append(event.content)
-                # Add tool notification
-                tool_msg = f"\n\n🔧 Using tool: {event.content}"
-                await updater.append(tool_msg, force=True)
-
-            elif event.type == "result":
-                # Store session info
-                if event.metadata.get("session_id"):
-                    session.claude_session_id = event.metadata["session_id"]
-                    runner.session_id = event.metadata["session_id"]
-                if event.metadata.get("cost"):
-                    cost = event.metadata["cost"]
-                    session_manager.add_cost(session.session_id, cost)
-                    # Add cost info to message
-                    await updater.append(f"\n\n💰 Cost: ${cost:.4f}", force=True)
-                response_parts.append(event.content)
-
-            elif event.type == "error":
-                error_msg = f"\n\n❌ Error: {event.content}"
-                await updater.append(error_msg, force=True)
-                logger.error(f"Claude CLI error: {event.content}")
-
-            elif event.type == "done":
-                # Final flush
-                await updater.finalize()
+            handler = _EVENT_HANDLERS.get(event.type)
+            if handler:
+                await handler(event, turn)
 
         # If no events received
         if event_count == 0:
@@ -991,18 +1359,17 @@ async def _handle_with_claude_cli(message, text, session, user_id, context=None)
             )
             return ""
 
-        # Build final response
-        final_response = updater.buffer or "\n".join(response_parts)
-
-        # If we never sent a message, send the final response
-        if updater.sent_message is None and final_response:
-            await message.reply_text(smart_truncate(final_response))
+        # Build final response, joining result parts only if nothing was streamed
+        final_response = updater.buffer
+        if not final_response:
+            final_response = "\n".join(turn.response_parts)
+            if final_response:
+                await updater.append(final_response)
+                if owns_updater:
+                    await updater.finalize()
 
         return final_response
 
-    except asyncio.CancelledError:
-        await message.reply_text("⏹️ Task cancelled by user.")
-        raise
     except Exception as e:
         logger.exception(f"Error in Claude CLI handler: {e}")
         await message.reply_text(
@@ -1010,52 +1377,44 @@ async def _handle_with_claude_cli(message, text, session, user_id, context=None)
             "Please try again or contact admin if the problem persists."
         )
         raise
+    finally:
+        if typing:
+            typing.stop()
 
 
-async def _handle_with_api_provider(message, text, session, provider, context=None):
+async def _handle_with_api_provider(message, text, session, provider, context=None, updater=None):
     """Handle message using API provider with optimized streaming."""
-    # Build messages from session history
-    messages = []
-    for msg in session.get_recent_messages(20):
-        messages.append({
-            "role": msg.role,
-            "content": msg.content
-        })
-    # Add current message
-    messages.append({"role": "user", "content": text})
+    # Build messages from session history; callers have already recorded
+    # the current message, so it is the last entry
+    messages = session.api_messages()
 
     # Get system prompt from SOUL.md
+    from backend.memory.manager import memory_manager
     system = await memory_manager.get_soul()
 
-    # Use streaming updater
-    updater = StreamingMessageUpdater(message)
-    last_typing_time = time.time()
+    # Use streaming updater; a caller-supplied one is finalized by the caller
+    owns_updater = updater is None
+    updater = updater or StreamingMessageUpdater(message)
     chunk_count = 0
+    # Keep the typing indicator alive while the provider streams
+    typing = TypingIndicator(context, message.chat_id, session) if context else None
 
     try:
+        if typing:
+            typing.start()
         async for chunk in provider.chat(messages, system=system, stream=True):
             chunk_count += 1
 
-            # Send typing indicator periodically
-            current_time = time.time()
-            if context and current_time - last_typing_time > 4:
-                try:
-                    await context.bot.send_chat_action(
-                        chat_id=message.chat_id,
-                        action=ChatAction.TYPING
-                    )
-                    last_typing_time = current_time
-                except Exception:
-                    pass
-
             # Append chunk to buffer
             await updater.append(chunk)
 
         # Final flush
-        await updater.finalize()
+        if owns_updater:
+            await updater.finalize()
 
         # Check if we got any response
-        if chunk_count == 0 or not updater.buffer:
+        response = updater.buffer
+        if chunk_count == 0 or not response:
             logger.warning("No response from API provider")
             await message.reply_text(
                 "⚠️ No response from API.\n\n"
@@ -1067,11 +1426,8 @@ async def _handle_with_api_provider(message, text, session, provider, context=No
             )
             return ""
 
-        return updater.buffer
+        return response
 
-    except asyncio.CancelledError:
-        await message.reply_text("⏹️ Task cancelled by user.")
-        raise
     except Exception as e:
         error_msg = str(e)
         logger.exception(f"API provider error: {e}")
@@ -1093,6 +1449,9 @@ async def _handle_with_api_provider(message, text, session, provider, context=No
                 "Please try again or contact admin if the problem persists."
             )
         raise
+    finally:
+        if typing:
+            typing.stop()
 
 
 @require_auth
@@ -1105,8 +1464,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not message:
         return
 
+    # Nothing to send; bail out before touching any session state
     text = message.text
-    if not text:
+    if not text or text.isspace():
         return
 
     # Get or create session
@@ -1123,103 +1483,122 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode="Markdown"
         )
 
-    # Check if runner is busy before doing anything
+    await _start_request(message, text, session, user_id, context)
+
+
+async def _start_request(message, text: str, session: "SessionContext", user_id: int, context):
+    """Queue a prompt as the session's next LLM turn, unless one is already in flight."""
+    # Check if a request is already running or queued for this session;
+    # reject rather than queue so a burst of messages can't pile up
     runner = runner_manager.get_active_runner(session.session_id)
-    if runner and runner.is_running:
+    if runner_manager.is_busy(session.session_id) or (runner and runner.is_running):
         await message.reply_text(
             "⏳ Still processing your previous request...\n\n"
             "You can:\n"
             "• Wait for it to complete\n"
             "• Use /stop to cancel\n"
             "• Use /status to check progress",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🛑 Stop", callback_data="menu:stop_task")
-            ]])
+            reply_markup=_STOP_KEYBOARD
         )
         return
 
+    # Show initial typing indicator
+    send_typing(context, message.chat_id, session)
+
+    # Send the processing notification without awaiting it, so the request
+    # is registered as busy before any other update can run
+    placeholder = asyncio.create_task(message.reply_text("🤔 Processing your request..."))
+
+    # Run the request in the background so other updates keep flowing;
+    # requests within a session still run one at a time, in order
+    runner_manager.spawn(
+        session.session_id,
+        _process_message(message, text, session, user_id, context, placeholder)
+    )
+
+
+async def _process_message(message, text, session, user_id, context, placeholder: Awaitable):
+    """Run a user message through the LLM and report the result."""
+    processing_msg = await placeholder
+
     # Add user message to session
     session.add_message("user", text)
     session_manager.update_session_state(session.session_id, SessionState.PROCESSING)
 
-    # Show initial typing indicator
-    await context.bot.send_chat_action(
-        chat_id=update.effective_chat.id,
-        action=ChatAction.TYPING
-    )
-
-    # Send processing notification
-    processing_msg = await message.reply_text("🤔 Processing your request...")
+    # Stream into the placeholder rather than a fresh message
+    updater = StreamingMessageUpdater(message, sent_message=processing_msg)
+    # Single state transition at the end of the turn
+    final_state = SessionState.IDLE
+    interrupted = False
+    status_handle = None
 
     try:
         # Check which provider to use
         provider = get_llm_provider()
+        status = (
+            "🤖 Invoking Claude Code CLI..." if provider is None
+            else f"🔌 Connecting to {provider.get_name()}..."
+        )
+        # Start the model call right away; only show the status line if the
+        # first output is slow to arrive
+        status_handle = asyncio.get_running_loop().call_later(
+            STATUS_DELAY, lambda: _fire_and_forget(updater.show_status(status))
+        )
 
         if provider is None:
             # Use Claude CLI (default)
-            await processing_msg.edit_text("🤖 Invoking Claude Code CLI...")
-            full_response = await _handle_with_claude_cli(message, text, session, user_id, context)
+            full_response = await _handle_with_claude_cli(
+                message, text, session, user_id, context, updater=updater
+            )
         else:
             # Use API provider
-            provider_name = provider.get_name()
-            await processing_msg.edit_text(f"🔌 Connecting to {provider_name}...")
-            full_response = await _handle_with_api_provider(message, text, session, provider, context)
-
-        # Delete processing message
-        try:
-            await processing_msg.delete()
-        except Exception:
-            pass
+            full_response = await _handle_with_api_provider(
+                message, text, session, provider, context, updater=updater
+            )
 
         # Add assistant response to session
         if full_response:
             session.add_message("assistant", full_response)
 
-        session_manager.update_session_state(session.session_id, SessionState.IDLE)
-
-        # Send completion notification with stats
-        completion_text = (
-            f"✅ Task completed\n"
-            f"💬 Messages: {len(session.messages)}\n"
-            f"💰 Total cost: ${session.total_cost:.4f}"
-        )
-
-        # Only send if response was actually generated
         if full_response:
-            await message.reply_text(
-                completion_text,
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⚡ Quick Actions", callback_data="show:actions"),
-                    InlineKeyboardButton("📋 Menu", callback_data="menu:show")
-                ]])
+            # Attach completion stats and buttons to the final streamed edit
+            await updater.finalize(
+                footer=COMPLETION_TEMPLATE.format(msgs=len(session.messages), cost=session.total_cost),
+                reply_markup=_COMPLETION_KEYBOARD,
+                html=True
             )
+        elif not updater.update_count:
+            # Nothing was streamed into the placeholder
+            try:
+                await processing_msg.delete()
+            except Exception:
+                pass
 
     except asyncio.CancelledError:
         # Task was cancelled
-        session_manager.update_session_state(session.session_id, SessionState.IDLE)
-        runner = runner_manager.get_active_runner(session.session_id)
-        if runner:
-            runner.state = RunnerState.IDLE
+        interrupted = True
+        # Keep a pending streamed edit from overwriting the report below
+        await updater.close()
+        # Keep any partial response; only reuse the placeholder if unused
+        report = message.reply_text if updater.update_count else processing_msg.edit_text
         try:
-            await processing_msg.edit_text("⏹️ Task cancelled.")
+            await report("⏹️ Task cancelled.")
         except Exception:
             pass
 
     except Exception as e:
         logger.exception(f"Error processing message for user {user_id}")
-        session_manager.update_session_state(session.session_id, SessionState.ERROR)
-
-        # Reset runner state so it can accept new requests
-        runner = runner_manager.get_active_runner(session.session_id)
-        if runner:
-            runner.state = RunnerState.IDLE
+        final_state = SessionState.ERROR
+        interrupted = True
+        await updater.close()
 
         # Provide detailed error message
         error_type = type(e).__name__
         error_msg = str(e)
 
+        report = message.reply_text if updater.update_count else processing_msg.edit_text
         try:
-            await processing_msg.edit_text(
+            await report(
                 f"❌ **Error: {error_type}**\n\n"
                 f"Details: {error_msg[:200]}\n\n"
                 f"The error has been logged. You can:\n"
@@ -1227,15 +1606,23 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"• Use /new to start fresh\n"
                 f"• Use /status to check system status",
                 parse_mode="Markdown",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🆕 New Session", callback_data="menu:new"),
-                    InlineKeyboardButton("📊 Status", callback_data="menu:status")
-                ]])
+                reply_markup=_ERROR_KEYBOARD
             )
         except Exception:
             # If editing fails, send as new message
             await message.reply_text(f"❌ Error: {error_msg[:500]}")
 
+    finally:
+        if status_handle:
+            status_handle.cancel()
+        if interrupted:
+            # Reset runner state so it can accept new requests; the CLI
+            # handler may have created the runner during this turn
+            runner = runner_manager.get_active_runner(session.session_id)
+            if runner:
+                runner.state = RunnerState.IDLE
+        session_manager.update_session_state(session.session_id, final_state)
+
 
 # ============ Callback Handler ============
 
@@ -1250,364 +1637,412 @@ QUICK_PROMPTS = {
 }
 
 
-@require_auth
-async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle inline keyboard callbacks."""
-    query = update.callback_query
-    user_id = update.effective_user.id
+async def _cb_menu_show(query, context, user_id):
+    await query.edit_message_text(
+        "📋 **Quick Menu**\n\nSelect an action:",
+        parse_mode="Markdown",
+        reply_markup=get_main_menu_keyboard()
+    )
 
-    data = query.data
 
-    # Handle menu actions
-    if data.startswith("menu:"):
-        action = data.split(":")[1]
-        await query.answer()
+async def _cb_menu_new(query, context, user_id):
+    # Create new session (runner will be created on first use)
+    session = session_manager.create_session(
+        user_id=user_id,
+        working_directory=settings.approved_directory_path
+    )
 
-        if action == "show":
-            await query.edit_message_text(
-                "📋 **Quick Menu**\n\nSelect an action:",
-                parse_mode="Markdown",
-                reply_markup=get_main_menu_keyboard()
-            )
+    await query.edit_message_text(
+        f"✨ **New session started!**\n\n"
+        f"Session ID: `{session.session_id}`\n"
+        f"📂 Directory: `{session.working_directory}`\n\n"
+        f"Send a message to start coding!",
+        parse_mode="Markdown",
+        reply_markup=get_quick_actions_keyboard()
+    )
 
-        elif action == "new":
-            # Create new session (runner will be created on first use)
-            session = session_manager.create_session(
-                user_id=user_id,
-                working_directory=settings.approved_directory_path
-            )
 
-            await query.edit_message_text(
-                f"✨ **New session started!**\n\n"
-                f"Session ID: `{session.session_id}`\n"
-                f"📂 Directory: `{session.working_directory}`\n\n"
-                f"Send a message to start coding!",
-                parse_mode="Markdown",
-                reply_markup=get_quick_actions_keyboard()
-            )
+async def _cb_menu_continue(query, context, user_id):
+    session = session_manager.get_active_session(user_id)
+    if session:
+        await query.edit_message_text(
+            f"▶️ **Continuing session**\n\n"
+            f"Session: `{session.session_id}`\n"
+            f"💬 Messages: {len(session.messages)}\n"
+            f"📂 Directory: `{session.working_directory}`",
+            parse_mode="Markdown",
+            reply_markup=get_quick_actions_keyboard()
+        )
+    else:
+        await query.edit_message_text(
+            "No active session. Create a new one?",
+            reply_markup=_NEW_SESSION_KEYBOARD
+        )
 
-        elif action == "continue":
-            session = session_manager.get_active_session(user_id)
-            if session:
-                await query.edit_message_text(
-                    f"▶️ **Continuing session**\n\n"
-                    f"Session: `{session.session_id}`\n"
-                    f"💬 Messages: {len(session.messages)}\n"
-                    f"📂 Directory: `{session.working_directory}`",
-                    parse_mode="Markdown",
-                    reply_markup=get_quick_actions_keyboard()
-                )
-            else:
-                await query.edit_message_text(
-                    "No active session. Create a new one?",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🆕 New Session", callback_data="menu:new")
-                    ]])
-                )
 
-        elif action == "ls":
-            runner = get_or_create_runner(user_id)
-            if not runner:
-                await query.edit_message_text("❌ Cannot create session. Max sessions limit reached.")
-                return
-            try:
-                entries = list(runner.working_directory.iterdir())
-                dirs = sorted([e for e in entries if e.is_dir()], key=lambda x: x.name)[:10]
-                files = sorted([e for e in entries if e.is_file()], key=lambda x: x.name)[:15]
-
-                lines = [f"📂 `{runner.working_directory}`\n"]
-                if dirs:
-                    lines.append("**Dirs:** " + ", ".join([f"`{d.name}/`" for d in dirs]))
-                if files:
-                    lines.append("**Files:** " + ", ".join([f"`{f.name}`" for f in files]))
-                if len(entries) > 25:
-                    lines.append(f"\n... +{len(entries) - 25} more")
-
-                await query.edit_message_text(
-                    "\n".join(lines),
-                    parse_mode="Markdown",
-                    reply_markup=get_main_menu_keyboard()
-                )
-            except Exception as e:
-                await query.edit_message_text(f"❌ Error: {e}")
+async def _cb_menu_ls(query, context, user_id):
+    runner = get_or_create_runner(user_id)
+    if not runner:
+        await query.edit_message_text("❌ Cannot create session. Max sessions limit reached.")
+        return
+    try:
+        dirs, files, dir_count, file_count = await asyncio.to_thread(
+            _list_dir, runner.working_directory, 10, 15
+        )
+        total = dir_count + file_count
 
-        elif action == "pwd":
-            runner = get_or_create_runner(user_id)
-            if not runner:
-                await query.edit_message_text("❌ Cannot create session. Max sessions limit reached.")
-                return
-            await query.edit_message_text(
-                f"📍 **Current Directory**\n\n`{runner.working_directory}`",
-                parse_mode="Markdown",
-                reply_markup=get_main_menu_keyboard()
-            )
+        lines = [f"📂 `{runner.working_directory}`\n"]
+        if dirs:
+            lines.append("**Dirs:** " + ", ".join([f"`{d.name}/`" for d in dirs]))
+        if files:
+            lines.append("**Files:** " + ", ".join([f"`{f.name}`" for f in files]))
+        if total > 25:
+            lines.append(f"\n... +{total - 25} more")
+
+        await query.edit_message_text(
+            "\n".join(lines),
+            parse_mode="Markdown",
+            reply_markup=get_main_menu_keyboard()
+        )
+    except Exception as e:
+        await query.edit_message_text(f"❌ Error: {e}")
 
-        elif action == "show_dirs":
-            # Show directory browser
-            runner = get_or_create_runner(user_id)
-            if not runner:
-                await query.edit_message_text("❌ Cannot create session. Max sessions limit reached.")
-                return
 
-            try:
-                approved_dir = settings.approved_directory_path
-                subdirs = []
-                if approved_dir.exists():
-                    subdirs = [d for d in approved_dir.iterdir() if d.is_dir() and not d.name.startswith('.')]
-                    subdirs = sorted(subdirs, key=lambda x: x.stat().st_mtime, reverse=True)[:8]
-
-                lines = [
-                    f"📂 **Directory Browser**\n",
-                    f"**Current:** `{runner.working_directory.name}/`\n",
-                    f"**Available Folders:**"
-                ]
-
-                keyboard = []
-                for d in subdirs:
-                    is_current = "👉 " if str(d) == str(runner.working_directory) else ""
-                    lines.append(f"{is_current}📁 `{d.name}/`")
-                    if str(d) != str(runner.working_directory):
-                        keyboard.append([InlineKeyboardButton(
-                            f"📁 {d.name}",
-                            callback_data=f"chdir:{d.name}"
-                        )])
-
-                keyboard.append([InlineKeyboardButton("◀️ Back", callback_data="menu:show")])
-
-                await query.edit_message_text(
-                    "\n".join(lines),
-                    parse_mode="Markdown",
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-            except Exception as e:
-                await query.edit_message_text(f"❌ Error: {e}")
+async def _cb_menu_pwd(query, context, user_id):
+    runner = get_or_create_runner(user_id)
+    if not runner:
+        await query.edit_message_text("❌ Cannot create session. Max sessions limit reached.")
+        return
+    await query.edit_message_text(
+        f"📍 **Current Directory**\n\n`{runner.working_directory}`",
+        parse_mode="Markdown",
+        reply_markup=get_main_menu_keyboard()
+    )
 
-        elif action == "status":
-            session = session_manager.get_active_session(user_id)
-            runner = runner_manager.get_active_runner(session.session_id) if session else None
-            provider = get_llm_provider()
-            provider_name = provider.get_name() if provider else "Claude CLI (Pro)"
 
-            lines = [
-                "📊 **Status**\n",
-                f"🔌 Provider: {provider_name}",
-            ]
+async def _cb_menu_show_dirs(query, context, user_id):
+    # Show directory browser
+    runner = get_or_create_runner(user_id)
+    if not runner:
+        await query.edit_message_text("❌ Cannot create session. Max sessions limit reached.")
+        return
 
-            if runner:
-                lines.append(f"🤖 Runner: {runner.state.value}")
-                lines.append(f"📂 Dir: `{runner.working_directory.name}/`")
-            else:
-                lines.append("🤖 Runner: Not started yet")
+    try:
+        approved_dir = settings.approved_directory_path
+        subdirs = []
+        if approved_dir.exists():
+            subdirs = await asyncio.to_thread(_scan_subdirs, approved_dir, 8)
 
-            if session:
-                lines.append(f"\n💬 Session: `{session.session_id}`")
-                lines.append(f"📝 Messages: {len(session.messages)}")
-                lines.append(f"💰 Cost: ${session.total_cost:.4f}")
+        lines = [
+            f"📂 **Directory Browser**\n",
+            f"**Current:** `{runner.working_directory.name}/`\n",
+            f"**Available Folders:**"
+        ]
 
-            await query.edit_message_text(
-                "\n".join(lines),
-                parse_mode="Markdown",
-                reply_markup=get_main_menu_keyboard()
-            )
+        keyboard = []
+        current_dir_str = str(runner.working_directory)
+        for d in subdirs:
+            is_current = str(d) == current_dir_str
+            lines.append(f"{'👉 ' if is_current else ''}📁 `{d.name}/`")
+            if not is_current:
+                keyboard.append([InlineKeyboardButton(
+                    f"📁 {d.name}",
+                    callback_data=f"chdir:{d.name}"
+                )])
 
-        elif action == "sessions":
-            sessions = session_manager.get_user_sessions(user_id)
-            if sessions:
-                keyboard = [
-                    [InlineKeyboardButton(
-                        f"{'🟢' if s.state.value == 'idle' else '🔄'} {s.session_id[:8]} ({len(s.messages)} msgs)",
-                        callback_data=f"session:{s.session_id}"
-                    )]
-                    for s in sessions[:5]
-                ]
-                keyboard.append([InlineKeyboardButton("◀️ Back", callback_data="menu:show")])
-
-                await query.edit_message_text(
-                    "📋 **Your Sessions**\n\nSelect one to switch:",
-                    parse_mode="Markdown",
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-            else:
-                await query.edit_message_text(
-                    "No sessions yet.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🆕 New Session", callback_data="menu:new")
-                    ]])
-                )
+        keyboard.append([InlineKeyboardButton("◀️ Back", callback_data="menu:show")])
 
-        elif action == "export":
-            session = session_manager.get_active_session(user_id)
-            if session:
-                await session_manager.save_session_to_file(session.session_id)
-                await query.answer("Session exported to file!", show_alert=True)
-                await query.edit_message_text(
-                    f"💾 **Exported**\n\nSession `{session.session_id}` saved.",
-                    parse_mode="Markdown",
-                    reply_markup=get_main_menu_keyboard()
-                )
-            else:
-                await query.answer("No active session", show_alert=True)
-
-        elif action == "stop_task":
-            # Stop current running task
-            session = session_manager.get_active_session(user_id)
-            if session:
-                await runner_manager.stop_runner(session.session_id, user_id)
-                session_manager.update_session_state(session.session_id, SessionState.IDLE)
-            await query.edit_message_text(
-                "🛑 **Task Stopped**\n\n"
-                "Your current task has been cancelled.\n"
-                "You can start a new one anytime.",
-                reply_markup=get_main_menu_keyboard()
-            )
+        await query.edit_message_text(
+            "\n".join(lines),
+            parse_mode="Markdown",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    except Exception as e:
+        await query.edit_message_text(f"❌ Error: {e}")
 
-        elif action == "end":
-            session = session_manager.get_active_session(user_id)
-            if session:
-                await runner_manager.stop_runner(session.session_id, user_id)
-                await session_manager.save_session_to_file(session.session_id)
 
-                # Extract and update user profile
-                messages_data = [{"role": m.role, "content": m.content} for m in session.messages]
-                await memory_manager.extract_and_update_user_profile(
-                    messages_data, str(session.working_directory)
-                )
+async def _cb_menu_status(query, context, user_id):
+    session = session_manager.get_active_session(user_id)
+    runner = runner_manager.get_active_runner(session.session_id) if session else None
+    provider = get_llm_provider()
+    provider_name = provider.get_name() if provider else "Claude CLI (Pro)"
 
-                session_manager._active_session.pop(user_id, None)
-
-                await query.edit_message_text(
-                    f"✅ **Session Ended**\n\n"
-                    f"Session: `{session.session_id}`\n"
-                    f"💬 Messages: {len(session.messages)}\n"
-                    f"💰 Cost: ${session.total_cost:.4f}",
-                    parse_mode="Markdown",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🆕 New Session", callback_data="menu:new")
-                    ]])
-                )
-            else:
-                await query.answer("No active session", show_alert=True)
+    lines = [
+        "📊 **Status**\n",
+        f"🔌 Provider: {provider_name}",
+    ]
 
-    # Handle show actions
-    elif data.startswith("show:"):
-        action = data.split(":")[1]
-        await query.answer()
+    if runner:
+        lines.append(f"🤖 Runner: {runner.state.value}")
+        lines.append(f"📂 Dir: `{runner.working_directory.name}/`")
+    else:
+        lines.append("🤖 Runner: Not started yet")
 
-        if action == "actions":
-            await query.edit_message_text(
-                "⚡ **Quick Actions**\n\nSelect a coding task:",
-                parse_mode="Markdown",
-                reply_markup=get_quick_actions_keyboard()
-            )
+    if session:
+        lines.append(f"\n💬 Session: `{session.session_id}`")
+        lines.append(f"📝 Messages: {len(session.messages)}")
+        lines.append(f"💰 Cost: ${session.total_cost:.4f}")
 
-    # Handle quick action prompts
-    elif data.startswith("quick:"):
-        action = data.split(":")[1]
-        if action in QUICK_PROMPTS:
-            await query.answer(f"Running {action}...")
-            # Trigger the message handler with the prompt
-            prompt = QUICK_PROMPTS[action]
-            # Send as a new message from user perspective
-            await query.message.reply_text(f"🚀 **{action.title()}**\n\n_{prompt}_", parse_mode="Markdown")
-
-            # Create a fake update to process
-            session = session_manager.get_active_session(user_id)
-            if not session:
-                session = session_manager.create_session(
-                    user_id=user_id,
-                    working_directory=settings.approved_directory_path
-                )
+    await query.edit_message_text(
+        "\n".join(lines),
+        parse_mode="Markdown",
+        reply_markup=get_main_menu_keyboard()
+    )
 
-            session.add_message("user", prompt)
-            session_manager.update_session_state(session.session_id, SessionState.PROCESSING)
 
-            # Show typing
-            await context.bot.send_chat_action(
-                chat_id=update.effective_chat.id,
-                action=ChatAction.TYPING
-            )
+async def _cb_menu_sessions(query, context, user_id):
+    sessions = session_manager.get_user_sessions(user_id)
+    if sessions:
+        keyboard = [
+            [InlineKeyboardButton(
+                f"{'🟢' if s.state.value == 'idle' else '🔄'} {s.session_id[:8]} ({len(s.messages)} msgs)",
+                callback_data=f"session:{s.session_id}"
+            )]
+            for s in sessions[:5]
+        ]
+        keyboard.append([InlineKeyboardButton("◀️ Back", callback_data="menu:show")])
+
+        await query.edit_message_text(
+            "📋 **Your Sessions**\n\nSelect one to switch:",
+            parse_mode="Markdown",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    else:
+        await query.edit_message_text(
+            "No sessions yet.",
+            reply_markup=_NEW_SESSION_KEYBOARD
+        )
+
+
+async def _cb_menu_export(query, context, user_id):
+    session = session_manager.get_active_session(user_id)
+    if session:
+        await session_manager.save_session_to_file(session.session_id)
+        await query.answer("Session exported to file!", show_alert=True)
+        await query.edit_message_text(
+            f"💾 **Exported**\n\nSession `{session.session_id}` saved.",
+            parse_mode="Markdown",
+            reply_markup=get_main_menu_keyboard()
+        )
+    else:
+        await query.answer("No active session", show_alert=True)
+
+
+async def _cb_menu_stop_task(query, context, user_id):
+    # Stop current running task
+    session = session_manager.get_active_session(user_id)
+    edit = query.edit_message_text(
+        "🛑 **Task Stopped**\n\n"
+        "Your current task has been cancelled.\n"
+        "You can start a new one anytime.",
+        reply_markup=get_main_menu_keyboard()
+    )
+    if not session:
+        await edit
+        return
+
+    # Edit the menu while the runner stops
+    await asyncio.gather(runner_manager.stop_runner(session.session_id, user_id), edit)
+    session_manager.update_session_state(session.session_id, SessionState.IDLE)
+
+
+async def _cb_menu_end(query, context, user_id):
+    session = session_manager.get_active_session(user_id)
+    if session:
+        await runner_manager.stop_runner(session.session_id, user_id)
+        await session_manager.save_session_to_file(session.session_id)
+
+        # Extract and update user profile
+        from backend.memory.manager import memory_manager
+        messages_data = [{"role": m.role, "content": m.content} for m in session.messages]
+        await memory_manager.extract_and_update_user_profile(
+            messages_data, str(session.working_directory)
+        )
+
+        session_manager.clear_active(user_id)
+
+        await query.edit_message_text(
+            f"✅ **Session Ended**\n\n"
+            f"Session: `{session.session_id}`\n"
+            f"💬 Messages: {len(session.messages)}\n"
+            f"💰 Cost: ${session.total_cost:.4f}",
+            parse_mode="Markdown",
+            reply_markup=_NEW_SESSION_KEYBOARD
+        )
+    else:
+        await query.answer("No active session", show_alert=True)
+
+
+async def _cb_show_actions(query, context, user_id):
+    await query.edit_message_text(
+        "⚡ **Quick Actions**\n\nSelect a coding task:",
+        parse_mode="Markdown",
+        reply_markup=get_quick_actions_keyboard()
+    )
+
+
+async def _cb_quick(query, context, user_id, action):
+    if action not in QUICK_PROMPTS:
+        return
+    await query.answer(f"Running {action}...")
+    prompt = QUICK_PROMPTS[action]
+    # Send as a new message from user perspective
+    await query.message.reply_text(f"🚀 **{action.title()}**\n\n_{prompt}_", parse_mode="Markdown")
+
+    session = session_manager.get_active_session(user_id)
+    if not session:
+        session = session_manager.create_session(
+            user_id=user_id,
+            working_directory=settings.approved_directory_path
+        )
+
+    # Same path as a typed message: busy check, per-session queue and /stop
+    await _start_request(query.message, prompt, session, user_id, context)
 
-            try:
-                provider = get_llm_provider()
-                if provider is None:
-                    response = await _handle_with_claude_cli(query.message, prompt, session, user_id, context)
-                else:
-                    response = await _handle_with_api_provider(query.message, prompt, session, provider, context)
-
-                if response:
-                    session.add_message("assistant", response)
-                session_manager.update_session_state(session.session_id, SessionState.IDLE)
-            except Exception as e:
-                logger.exception("Error in quick action")
-                await query.message.reply_text(f"❌ Error: {e}")
 
+async def _cb_session(query, context, user_id, session_id):
     # Handle session switch
-    elif data.startswith("session:"):
-        session_id = data.split(":")[1]
-        await query.answer()
+    await query.answer()
 
-        if session_manager.set_active_session(user_id, session_id):
-            session = session_manager.get_session(session_id)
+    if session_manager.set_active_session(user_id, session_id):
+        session = session_manager.get_session(session_id)
+
+        await query.edit_message_text(
+            f"✅ **Switched to session**\n\n"
+            f"Session: `{session_id}`\n"
+            f"📂 Directory: `{session.working_directory}`",
+            parse_mode="Markdown",
+            reply_markup=get_quick_actions_keyboard()
+        )
+    else:
+        await query.edit_message_text("❌ Failed to switch session")
 
-            await query.edit_message_text(
-                f"✅ **Switched to session**\n\n"
-                f"Session: `{session_id}`\n"
-                f"📂 Directory: `{session.working_directory}`",
-                parse_mode="Markdown",
-                reply_markup=get_quick_actions_keyboard()
-            )
-        else:
-            await query.edit_message_text("❌ Failed to switch session")
 
+async def _cb_chdir(query, context, user_id, dir_name):
     # Handle directory change from button
-    elif data.startswith("chdir:"):
-        dir_name = data.split(":", 1)[1]
-        await query.answer()
+    await query.answer()
 
-        session = session_manager.get_active_session(user_id)
-        runner = get_or_create_runner(user_id, session)
+    session = session_manager.get_active_session(user_id)
+    runner = get_or_create_runner(user_id, session)
 
-        if not runner:
-            await query.edit_message_text("❌ Cannot create session. Max sessions limit reached.")
-            return
+    if not runner:
+        await query.edit_message_text("❌ Cannot create session. Max sessions limit reached.")
+        return
 
-        # Try to find directory
-        target_path = None
+    # Try to find directory
+    target_path = None
 
-        # Try as subdirectory of approved directory
-        candidate = settings.approved_directory_path / dir_name
+    # Try as subdirectory of approved directory
+    candidate = settings.approved_directory_path / dir_name
+    if candidate.exists() and candidate.is_dir():
+        target_path = candidate
+    else:
+        # Try as subdirectory of current directory
+        candidate = runner.working_directory / dir_name
         if candidate.exists() and candidate.is_dir():
             target_path = candidate
-        else:
-            # Try as subdirectory of current directory
-            candidate = runner.working_directory / dir_name
-            if candidate.exists() and candidate.is_dir():
-                target_path = candidate
-
-        if target_path and runner.change_directory(target_path):
-            if session:
-                session.working_directory = runner.working_directory
-
-            await query.edit_message_text(
-                f"✅ **Directory Changed**\n\n"
-                f"📂 Now in: `{runner.working_directory}`\n\n"
-                f"Ready to start coding!",
-                parse_mode="Markdown",
-                reply_markup=get_quick_actions_keyboard()
-            )
-        else:
-            await query.edit_message_text(
-                f"❌ **Cannot change to:** `{dir_name}`\n\n"
-                f"Use `/dirs` to see available directories.",
-                parse_mode="Markdown",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("📂 Show Dirs", callback_data="menu:show_dirs")
-                ]])
-            )
+
+    if target_path and runner.change_directory(target_path):
+        if session:
+            session.set_working_directory(runner.working_directory)
+
+        await query.edit_message_text(
+            f"✅ **Directory Changed**\n\n"
+            f"📂 Now in: `{runner.working_directory}`\n\n"
+            f"Ready to start coding!",
+            parse_mode="Markdown",
+            reply_markup=get_quick_actions_keyboard()
+        )
+    else:
+        await query.edit_message_text(
+            f"❌ **Cannot change to:** `{dir_name}`\n\n"
+            f"Use `/dirs` to see available directories.",
+            parse_mode="Markdown",
+            reply_markup=_SHOW_DIRS_KEYBOARD
+        )
+
+
+# Callbacks with a fixed set of actions: prefix -> action -> handler(query, context, user_id)
+CALLBACK_HANDLERS: Dict[str, Dict[str, Callable[..., Awaitable[None]]]] = {
+    "menu": {
+        "show": _cb_menu_show,
+        "new": _cb_menu_new,
+        "continue": _cb_menu_continue,
+        "ls": _cb_menu_ls,
+        "pwd": _cb_menu_pwd,
+        "show_dirs": _cb_menu_show_dirs,
+        "status": _cb_menu_status,
+        "sessions": _cb_menu_sessions,
+        "export": _cb_menu_export,
+        "stop_task": _cb_menu_stop_task,
+        "end": _cb_menu_end,
+    },
+    "show": {
+        "actions": _cb_show_actions,
+    },
+}
+
+# Callbacks whose suffix is an argument: prefix -> handler(query, context, user_id, arg)
+CALLBACK_ARG_HANDLERS: Dict[str, Callable[..., Awaitable[None]]] = {
+    "quick": _cb_quick,
+    "session": _cb_session,
+    "chdir": _cb_chdir,
+}
+
+
+@require_auth
+async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle inline keyboard callbacks."""
+    query = update.callback_query
+    user_id = update.effective_user.id
+
+    prefix, sep, action = query.data.partition(":")
+    if not sep:
+        logger.debug(f"Ignoring malformed callback data: {query.data!r}")
+        return
+
+    actions = CALLBACK_HANDLERS.get(prefix)
+    if actions is not None:
+        await query.answer()
+        handler = actions.get(action)
+        if handler:
+            await handler(query, context, user_id)
+            return
+    else:
+        handler = CALLBACK_ARG_HANDLERS.get(prefix)
+        if handler:
+            await handler(query, context, user_id, action)
+            return
+
+    logger.debug(f"Unknown callback: {query.data!r}")
 
 
 # ============ Application Setup ============
 
+# Bot commands and their handlers, in registration order
+_COMMANDS: tuple[tuple[str, Callable[..., Awaitable[None]]], ...] = (
+    ("start", start_command),
+    ("help", help_command),
+    ("menu", menu_command),
+    ("actions", actions_command),
+    ("new", new_session_command),
+    ("continue", continue_session_command),
+    ("sessions", sessions_command),
+    ("dirs", dirs_command),
+    ("cd", cd_command),
+    ("ls", ls_command),
+    ("tree", tree_command),
+    ("pwd", pwd_command),
+    ("status", status_command),
+    ("usage", usage_command),
+    ("stats", stats_command),
+    ("stop", stop_command),
+    ("end", end_command),
+    ("clear", clear_command),
+    ("export", export_command),
+)
+
+
 async def post_init(application: Application) -> None:
     """Set up bot commands after initialization."""
     commands = [
@@ -1638,11 +2073,13 @@ def create_bot_application() -> Application:
     """Create and configure the Telegram bot application."""
     builder = Application.builder().token(settings.telegram_bot_token)
 
-    # Add proxy if configured
+    # Add proxy if configured; let PTB build its pooled clients around it rather
+    # than passing a custom HTTPXRequest, whose pool defaults to one connection
     if settings.proxy_url:
-        from telegram.request import HTTPXRequest
-        request = HTTPXRequest(proxy=settings.proxy_url)
-        builder = builder.request(request)
+        builder = builder.proxy(settings.proxy_url).get_updates_proxy(settings.proxy_url)
+
+    # Let PTB pace outgoing requests and back off on flood-control errors
+    builder = builder.rate_limiter(AIORateLimiter())
 
     # Add post_init callback to set commands
     builder = builder.post_init(post_init)
@@ -1650,25 +2087,8 @@ def create_bot_application() -> Application:
     application = builder.build()
 
     # Command handlers
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("menu", menu_command))
-    application.add_handler(CommandHandler("actions", actions_command))
-    application.add_handler(CommandHandler("new", new_session_command))
-    application.add_handler(CommandHandler("continue", continue_session_command))
-    application.add_handler(CommandHandler("sessions", sessions_command))
-    application.add_handler(CommandHandler("dirs", dirs_command))
-    application.add_handler(CommandHandler("cd", cd_command))
-    application.add_handler(CommandHandler("ls", ls_command))
-    application.add_handler(CommandHandler("tree", tree_command))
-    application.add_handler(CommandHandler("pwd", pwd_command))
-    application.add_handler(CommandHandler("status", status_command))
-    application.add_handler(CommandHandler("usage", usage_command))
-    application.add_handler(CommandHandler("stats", stats_command))
-    application.add_handler(CommandHandler("stop", stop_command))
-    application.add_handler(CommandHandler("end", end_command))
-    application.add_handler(CommandHandler("clear", clear_command))
-    application.add_handler(CommandHandler("export", export_command))
+    for name, callback in _COMMANDS:
+        application.add_handler(CommandHandler(name, callback))
 
     # Callback query handler
     application.add_handler(CallbackQueryHandler(handle_callback))
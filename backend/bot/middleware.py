@@ -1,11 +1,12 @@
 """Telegram bot middleware for authentication and rate limiting."""
 
+import asyncio
 import logging
 import time
-from collections import defaultdict
-from datetime import datetime
+from collections import OrderedDict, defaultdict, deque
+from datetime import date, datetime, timedelta
 from functools import wraps
-from typing import Callable, Dict, List, Optional
+from typing import Callable, Deque, Dict, FrozenSet, List, Optional, Tuple
 
 from telegram import Update
 from telegram.ext import ContextTypes
@@ -17,92 +18,189 @@ logger = logging.getLogger(__name__)
 
 
 class RateLimiter:
-    """Token bucket rate limiter."""
+    """Sliding window rate limiter."""
+
+    __slots__ = ("max_requests", "window_seconds", "_requests")
 
     def __init__(self, max_requests: int, window_seconds: int):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self._requests: Dict[int, List[float]] = defaultdict(list)
+        # Request times per user, oldest first; never more than max_requests are kept
+        self._requests: Dict[int, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=self.max_requests)
+        )
 
     def is_allowed(self, user_id: int) -> bool:
         """Check if a request is allowed for the given user."""
-        now = time.time()
+        requests = self._requests[user_id]
+        now = time.monotonic()
         window_start = now - self.window_seconds
 
-        # Clean old requests
-        self._requests[user_id] = [
-            t for t in self._requests[user_id] if t > window_start
-        ]
+        # Drop requests that have left the window
+        while requests and requests[0] <= window_start:
+            requests.popleft()
 
         # Check limit
-        if len(self._requests[user_id]) >= self.max_requests:
+        if len(requests) >= self.max_requests:
             return False
 
         # Record this request
-        self._requests[user_id].append(now)
+        requests.append(now)
         return True
 
     def get_retry_after(self, user_id: int) -> Optional[float]:
         """Get seconds until next request is allowed."""
-        if not self._requests[user_id]:
+        requests = self._requests.get(user_id)
+        if not requests:
             return None
 
-        oldest = min(self._requests[user_id])
-        retry_after = oldest + self.window_seconds - time.time()
+        retry_after = requests[0] + self.window_seconds - time.monotonic()
         return max(0, retry_after)
 
 
+# Seconds to wait on Redis before using the in-process limiter
+REDIS_TIMEOUT = 0.5
+
+
+class RedisRateLimiter:
+    """Fixed window rate limiter kept in Redis, so limits hold across bot processes."""
+
+    def __init__(self, url: str, max_requests: int, window_seconds: int, fallback: RateLimiter):
+        import redis.asyncio as aioredis
+
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        # Used while Redis is unreachable
+        self.fallback = fallback
+        # Short timeouts so an unreachable Redis falls back quickly instead of stalling messages
+        self._redis = aioredis.from_url(
+            url,
+            socket_connect_timeout=REDIS_TIMEOUT,
+            socket_timeout=REDIS_TIMEOUT,
+        )
+
+    async def aclose(self):
+        """Close the Redis connection pool."""
+        await self._redis.aclose()
+
+    async def is_allowed(self, user_id: int) -> bool:
+        """Count a request in the current window and check it against the limit."""
+        key = f"rl:{user_id}:{int(time.time()) // self.window_seconds}"
+        try:
+            pipe = self._redis.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, self.window_seconds)
+            count, _ = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis rate limiter unavailable, using in-process limits: {e}")
+            return self.fallback.is_allowed(user_id)
+        return count <= self.max_requests
+
+    def get_retry_after(self, user_id: int) -> Optional[float]:
+        """Get seconds until the current window ends."""
+        return self.window_seconds - time.time() % self.window_seconds
+
+
 # Global rate limiter
 rate_limiter = RateLimiter(
     max_requests=settings.rate_limit_requests,
     window_seconds=settings.rate_limit_window
 )
 
+# Shared rate limiter, when Redis is configured
+shared_rate_limiter: Optional[RedisRateLimiter] = None
+if settings.redis_url:
+    try:
+        shared_rate_limiter = RedisRateLimiter(
+            settings.redis_url,
+            max_requests=settings.rate_limit_requests,
+            window_seconds=settings.rate_limit_window,
+            fallback=rate_limiter,
+        )
+    except ImportError:
+        logger.warning("REDIS_URL is set but the redis package is not installed; using in-process rate limits")
+
+
+async def close_rate_limiter():
+    """Close the shared rate limiter's Redis connections, if one is configured."""
+    if shared_rate_limiter:
+        await shared_rate_limiter.aclose()
+
+
+async def check_rate_limit(user_id: int) -> Optional[float]:
+    """Record a request; return None if allowed, else seconds until the next one is."""
+    if shared_rate_limiter:
+        if await shared_rate_limiter.is_allowed(user_id):
+            return None
+        return shared_rate_limiter.get_retry_after(user_id)
+    if rate_limiter.is_allowed(user_id):
+        return None
+    return rate_limiter.get_retry_after(user_id) or 0.0
+
+
+# Allowed users, parsed once from settings; the first configured user is admin
+_ALLOWED_USERS: FrozenSet[int] = frozenset(settings.allowed_users_list)
+_ADMIN_ID: Optional[int] = settings.allowed_users_list[0] if _ALLOWED_USERS else None
+
 
 def is_user_allowed(user_id: int) -> bool:
     """Check if a user is in the allowed list."""
     # If no users configured, allow all (for testing)
-    allowed = settings.allowed_users_list
-    if not allowed:
+    if not _ALLOWED_USERS:
         return True
-    return user_id in allowed
+    return user_id in _ALLOWED_USERS
 
 
 class ActivityTracker:
     """Track user activity for analytics and auto-cleanup."""
 
+    __slots__ = ("_last_activity", "_command_count", "_total_commands")
+
     def __init__(self):
-        self._last_activity: Dict[int, datetime] = {}
+        # user_id -> time.monotonic() of last activity, least recently active first
+        self._last_activity: "OrderedDict[int, float]" = OrderedDict()
         self._command_count: Dict[int, int] = defaultdict(int)
         self._total_commands: int = 0
 
     def record_activity(self, user_id: int, command: str = ""):
         """Record user activity."""
-        self._last_activity[user_id] = datetime.now()
+        self._last_activity[user_id] = time.monotonic()
+        self._last_activity.move_to_end(user_id)
         if command:
             self._command_count[user_id] += 1
             self._total_commands += 1
 
     def get_last_activity(self, user_id: int) -> Optional[datetime]:
         """Get last activity time for user."""
-        return self._last_activity.get(user_id)
+        last_time = self._last_activity.get(user_id)
+        if last_time is None:
+            return None
+        return datetime.now() - timedelta(seconds=time.monotonic() - last_time)
 
     def get_inactive_users(self, minutes: int = 60) -> List[int]:
         """Get users inactive for specified minutes."""
-        now = datetime.now()
+        cutoff = time.monotonic() - minutes * 60
         inactive = []
+        # Oldest first, so stop at the first user active since the cutoff
         for user_id, last_time in self._last_activity.items():
-            if (now - last_time).total_seconds() > minutes * 60:
-                inactive.append(user_id)
+            if last_time >= cutoff:
+                break
+            inactive.append(user_id)
         return inactive
 
     def get_stats(self) -> Dict:
         """Get activity statistics."""
+        cutoff = time.monotonic() - 3600
+        active_users = 0
+        # Newest first, so stop at the first user idle for over an hour
+        for last_time in reversed(self._last_activity.values()):
+            if last_time < cutoff:
+                break
+            active_users += 1
         return {
             "total_users": len(self._last_activity),
             "total_commands": self._total_commands,
-            "active_users": len([u for u in self._last_activity.keys()
-                                if (datetime.now() - self._last_activity[u]).total_seconds() < 3600])
+            "active_users": active_users,
         }
 
 
@@ -110,6 +208,62 @@ class ActivityTracker:
 activity_tracker = ActivityTracker()
 
 
+class DailyRequestCounter:
+    """Accumulate daily request counts in memory and write them in periodic batches."""
+
+    def __init__(self, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[str, int], int] = defaultdict(int)  # (date, user_id) -> count
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: int):
+        """Count one request for today; written on the next flush."""
+        self._pending[(date.today().isoformat(), user_id)] += 1
+
+    async def flush(self):
+        """Write pending counts to the database in one batch."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, defaultdict(int)
+        try:
+            await db.bulk_increment(
+                (day, user_id, count) for (day, user_id), count in pending.items()
+            )
+        except Exception as e:
+            logger.error(f"Failed to record daily request counts, will retry: {e}")
+            # Merge the batch back so the next flush writes it
+            for key, count in pending.items():
+                self._pending[key] += count
+
+    async def start(self):
+        """Start the background flush task."""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flush task and write whatever is still pending."""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def _flush_loop(self):
+        """Background loop for periodic flushes."""
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+
+
+# Global daily request counter
+request_counter = DailyRequestCounter()
+
+
 def require_auth(func: Callable) -> Callable:
     """Decorator to require user authentication with activity tracking."""
 
@@ -135,8 +289,8 @@ def require_auth(func: Callable) -> Callable:
             return
 
         # Check rate limit
-        if not rate_limiter.is_allowed(user_id):
-            retry_after = rate_limiter.get_retry_after(user_id)
+        retry_after = await check_rate_limit(user_id)
+        if retry_after is not None:
             logger.info(f"Rate limit exceeded for user {user_id}")
             message = update.message or update.callback_query.message if update.callback_query else None
             if message:
@@ -151,11 +305,8 @@ def require_auth(func: Callable) -> Callable:
         activity_tracker.record_activity(user_id, command_name)
         logger.info(f"User {user_id} ({user.username or user.first_name}) executed: {command_name}")
         
-        # Record daily request count
-        try:
-            await db.increment_daily_request_count(user_id)
-        except Exception as e:
-            logger.error(f"Failed to record daily request count: {e}")
+        # Record daily request count; written to the database in batches
+        request_counter.record(user_id)
 
         return await func(update, context, *args, **kwargs)
 
@@ -172,8 +323,7 @@ def admin_only(func: Callable) -> Callable:
             return
 
         # First user in allowed list is admin
-        allowed = settings.allowed_users_list
-        if allowed and user.id != allowed[0]:
+        if _ADMIN_ID is not None and user.id != _ADMIN_ID:
             await update.message.reply_text("⛔ This command is admin-only.")
             return
 
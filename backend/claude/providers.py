@@ -1,19 +1,26 @@
 """LLM Provider abstraction for multiple backends."""
 
-import json
+import asyncio
+import importlib.util
 import logging
 import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import AsyncIterator, Optional, Dict, Any
 
 import httpx
 import jwt
+import orjson
+from aiolimiter import AsyncLimiter
 
 from backend.config import settings
 
 logger = logging.getLogger(__name__)
 
+# HTTP/2 lets concurrent streams share one connection; httpx needs the h2 package for it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
 
 @dataclass
 class LLMResponse:
@@ -25,9 +32,53 @@ class LLMResponse:
     raw: Dict[str, Any] = None
 
 
+# Sentinel OpenAI-style APIs send as the last data line of a stream
+_SSE_DONE = b"[DONE]"
+
+
+async def _iter_sse_data(response: httpx.Response) -> AsyncIterator[bytearray]:
+    """Yield the payload of each SSE data line, matched on raw bytes without decoding."""
+    buf = bytearray()
+    async for chunk in response.aiter_bytes():
+        buf += chunk
+        start = 0
+        while (end := buf.find(b"\n", start)) >= 0:
+            if buf.startswith(b"data:", start):
+                # strip() drops the optional space after the colon and any trailing \r
+                data = buf[start + 5:end].strip()
+                if data == _SSE_DONE:
+                    # End of stream; skip anything the server sends after it
+                    return
+                yield data
+            start = end + 1
+        del buf[:start]
+
+
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
 
+    def __init__(self, rpm: int = 0):
+        # Spaces requests out to the API's requests-per-minute limit; 0 means unlimited
+        self._limiter = AsyncLimiter(rpm, 60) if rpm > 0 else None
+        # Long-lived client so keep-alive connections are reused across chats
+        self._client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=settings.claude_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive,
+            ),
+        )
+
+    async def aclose(self):
+        """Close pooled HTTP connections."""
+        await self._client.aclose()
+
+    async def _throttle(self):
+        """Wait for a request slot under the provider's rate limit."""
+        if self._limiter:
+            await self._limiter.acquire()
+
     @abstractmethod
     async def chat(
         self,
@@ -43,14 +94,33 @@ class LLMProvider(ABC):
         """Get provider name."""
         pass
 
+    async def batch_chat(self, jobs: list[dict], max_concurrency: int = 10) -> list[str]:
+        """Run several chats concurrently, returning each full response in job order.
+
+        Each job holds chat() keyword arguments; at most max_concurrency stream at once.
+        """
+        slots = asyncio.Semaphore(max_concurrency)
+
+        async def run(job: dict) -> str:
+            async with slots:
+                return "".join([chunk async for chunk in self.chat(**job)])
+
+        return await asyncio.gather(*(run(job) for job in jobs))
+
 
 class AnthropicProvider(LLMProvider):
     """Anthropic API provider."""
 
     def __init__(self):
+        super().__init__(settings.anthropic_rpm)
         self.api_key = settings.anthropic_api_key
         self.model = settings.anthropic_model
         self.base_url = "https://api.anthropic.com/v1"
+        self._headers = {
+            "x-api-key": self.api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
 
     def get_name(self) -> str:
         return f"Anthropic ({self.model})"
@@ -62,12 +132,6 @@ class AnthropicProvider(LLMProvider):
         stream: bool = False
     ) -> AsyncIterator[str]:
         """Chat with streaming response."""
-        headers = {
-            "x-api-key": self.api_key,
-            "anthropic-version": "2023-06-01",
-            "content-type": "application/json"
-        }
-
         payload = {
             "model": self.model,
             "max_tokens": 4096,
@@ -77,36 +141,46 @@ class AnthropicProvider(LLMProvider):
         if system:
             payload["system"] = system
 
-        async with httpx.AsyncClient(timeout=settings.claude_timeout) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/messages",
-                headers=headers,
-                json=payload
-            ) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        try:
-                            data = json.loads(line[6:])
-                            if data.get("type") == "content_block_delta":
-                                delta = data.get("delta", {})
-                                if delta.get("type") == "text_delta":
-                                    yield delta.get("text", "")
-                        except json.JSONDecodeError:
-                            pass
-
-
-class OpenAIProvider(LLMProvider):
-    """OpenAI API provider."""
-
-    def __init__(self):
-        self.api_key = settings.openai_api_key
-        self.model = settings.openai_model
-        self.base_url = "https://api.openai.com/v1"
+        await self._throttle()
+        async with self._client.stream(
+            "POST",
+            f"{self.base_url}/messages",
+            headers=self._headers,
+            content=orjson.dumps(payload)
+        ) as response:
+            response.raise_for_status()
+            async for event in _iter_sse_data(response):
+                try:
+                    data = orjson.loads(event)
+                except orjson.JSONDecodeError:
+                    continue
+                event_type = data.get("type")
+                if event_type == "content_block_delta":
+                    delta = data.get("delta", {})
+                    if delta.get("type") == "text_delta":
+                        yield delta.get("text", "")
+                elif event_type == "message_stop":
+                    # Last event of the message; release the connection now
+                    break
+
+
+class _OpenAICompatProvider(LLMProvider):
+    """Base for APIs that speak the OpenAI chat completions protocol."""
+
+    def __init__(self, api_key: str, model: str, base_url: str, rpm: int = 0, extra_headers: Optional[Dict[str, str]] = None):
+        super().__init__(rpm)
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self._headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            **(extra_headers or {})
+        }
 
-    def get_name(self) -> str:
-        return f"OpenAI ({self.model})"
+    def _auth_headers(self) -> Dict[str, str]:
+        """Get request headers."""
+        return self._headers
 
     async def chat(
         self,
@@ -115,12 +189,7 @@ class OpenAIProvider(LLMProvider):
         stream: bool = False
     ) -> AsyncIterator[str]:
         """Chat with streaming response."""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        # OpenAI uses system message in messages array
+        # System prompt goes in the messages array
         all_messages = []
         if system:
             all_messages.append({"role": "system", "content": system})
@@ -132,89 +201,78 @@ class OpenAIProvider(LLMProvider):
             "stream": True
         }
 
-        async with httpx.AsyncClient(timeout=settings.claude_timeout) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            ) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: ") and line != "data: [DONE]":
-                        try:
-                            data = json.loads(line[6:])
-                            delta = data.get("choices", [{}])[0].get("delta", {})
-                            if "content" in delta:
-                                yield delta["content"]
-                        except json.JSONDecodeError:
-                            pass
-
-
-class OpenRouterProvider(LLMProvider):
+        logger.debug("API Request: base_url=%s model=%s messages_count=%d", self.base_url, self.model, len(all_messages))
+
+        await self._throttle()
+        async with self._client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            headers=self._auth_headers(),
+            content=orjson.dumps(payload)
+        ) as response:
+            if response.status_code != 200:
+                error_body = await response.aread()
+                logger.error(f"{self.get_name()} API Error: status={response.status_code}, body={error_body.decode()}")
+            response.raise_for_status()
+            async for event in _iter_sse_data(response):
+                try:
+                    data = orjson.loads(event)
+                    delta = data.get("choices", [{}])[0].get("delta", {})
+                    if "content" in delta:
+                        yield delta["content"]
+                except orjson.JSONDecodeError:
+                    pass
+
+
+class OpenAIProvider(_OpenAICompatProvider):
+    """OpenAI API provider."""
+
+    def __init__(self):
+        super().__init__(
+            settings.openai_api_key,
+            settings.openai_model,
+            "https://api.openai.com/v1",
+            rpm=settings.openai_rpm,
+        )
+
+    def get_name(self) -> str:
+        return f"OpenAI ({self.model})"
+
+
+class OpenRouterProvider(_OpenAICompatProvider):
     """OpenRouter API provider (supports many models)."""
 
     def __init__(self):
-        self.api_key = settings.openrouter_api_key
-        self.model = settings.openrouter_model
-        self.base_url = "https://openrouter.ai/api/v1"
+        super().__init__(
+            settings.openrouter_api_key,
+            settings.openrouter_model,
+            "https://openrouter.ai/api/v1",
+            rpm=settings.openrouter_rpm,
+            extra_headers={"HTTP-Referer": "https://github.com/ccbot", "X-Title": "ccBot"},
+        )
 
     def get_name(self) -> str:
         return f"OpenRouter ({self.model})"
 
-    async def chat(
-        self,
-        messages: list[dict],
-        system: str = None,
-        stream: bool = False
-    ) -> AsyncIterator[str]:
-        """Chat with streaming response."""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://github.com/ccbot",
-            "X-Title": "ccBot"
-        }
 
-        all_messages = []
-        if system:
-            all_messages.append({"role": "system", "content": system})
-        all_messages.extend(messages)
+# GLM JWT lifetime, and how long before expiry a new one is generated
+JWT_TTL = 3600
+JWT_REFRESH_MARGIN = 300
 
-        payload = {
-            "model": self.model,
-            "messages": all_messages,
-            "stream": True
-        }
 
-        async with httpx.AsyncClient(timeout=settings.claude_timeout) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            ) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: ") and line != "data: [DONE]":
-                        try:
-                            data = json.loads(line[6:])
-                            delta = data.get("choices", [{}])[0].get("delta", {})
-                            if "content" in delta:
-                                yield delta["content"]
-                        except json.JSONDecodeError:
-                            pass
-
-
-class GLMProvider(LLMProvider):
+class GLMProvider(_OpenAICompatProvider):
     """GLM (智谱AI) API provider."""
 
     def __init__(self):
-        self.api_key = settings.glm_api_key
-        self.model = settings.glm_model
-        self.base_url = "https://open.bigmodel.cn/api/paas/v4"
+        super().__init__(
+            settings.glm_api_key,
+            settings.glm_model,
+            "https://open.bigmodel.cn/api/paas/v4",
+            rpm=settings.glm_rpm,
+        )
         # Try JWT auth if API key has format {id}.{secret}, otherwise use direct auth
         self.use_jwt = "." in self.api_key
+        self._token_expires = 0.0  # time.time() when the current JWT expires
 
     def get_name(self) -> str:
         return f"GLM ({self.model})"
@@ -247,68 +305,23 @@ class GLMProvider(LLMProvider):
             headers={"alg": "HS256", "sign_type": "SIGN"},
         )
 
-    async def chat(
-        self,
-        messages: list[dict],
-        system: str = None,
-        stream: bool = False
-    ) -> AsyncIterator[str]:
-        """Chat with streaming response."""
-        # Choose authentication method
-        if self.use_jwt:
+    def _auth_headers(self) -> Dict[str, str]:
+        """Get request headers, refreshing the JWT shortly before it expires."""
+        if self.use_jwt and time.time() >= self._token_expires - JWT_REFRESH_MARGIN:
             # Generate JWT token from {id}.{secret} format API key
-            token = self._generate_token()
-            logger.debug("Using JWT authentication for GLM API")
-        else:
-            # Use API key directly
-            token = self.api_key
-            logger.debug("Using direct API key authentication for GLM API")
-
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-
-        all_messages = []
-        if system:
-            all_messages.append({"role": "system", "content": system})
-        all_messages.extend(messages)
-
-        payload = {
-            "model": self.model,
-            "messages": all_messages,
-            "stream": True
-        }
-
-        logger.debug(f"GLM API Request: model={self.model}, messages_count={len(all_messages)}, use_jwt={self.use_jwt}")
-
-        async with httpx.AsyncClient(timeout=settings.claude_timeout) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status_code != 200:
-                    error_body = await response.aread()
-                    logger.error(f"GLM API Error: status={response.status_code}, body={error_body.decode()}")
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: ") and line != "data: [DONE]":
-                        try:
-                            data = json.loads(line[6:])
-                            delta = data.get("choices", [{}])[0].get("delta", {})
-                            if "content" in delta:
-                                yield delta["content"]
-                        except json.JSONDecodeError:
-                            pass
+            self._headers = {**self._headers, "Authorization": f"Bearer {self._generate_token(JWT_TTL)}"}
+            self._token_expires = time.time() + JWT_TTL
+            logger.debug("Generated new JWT for GLM API")
+        return self._headers
 
 
+@lru_cache(maxsize=1)
 def get_llm_provider() -> Optional[LLMProvider]:
     """
     Get the configured LLM provider.
 
-    Returns None if using claude-cli (handled separately).
+    Returns None if using claude-cli (handled separately). The result is
+    cached; call get_llm_provider.cache_clear() after changing settings.
     """
     provider = settings.llm_provider.lower()
 
@@ -337,3 +350,14 @@ def get_llm_provider() -> Optional[LLMProvider]:
 
     else:
         raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+async def close_llm_providers():
+    """Close the cached provider's HTTP client, if one was created."""
+    # Failed lookups aren't cached, so a cached entry is always a built provider
+    if not get_llm_provider.cache_info().currsize:
+        return
+    provider = get_llm_provider()
+    get_llm_provider.cache_clear()
+    if provider:
+        await provider.aclose()
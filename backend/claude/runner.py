@@ -1,7 +1,6 @@
 """Claude Code CLI subprocess manager with interactive mode support."""
 
 import asyncio
-import json
 import logging
 import os
 import re
@@ -10,7 +9,9 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import AsyncIterator, Callable, Optional, Dict, Any, List
+from typing import AsyncIterator, Awaitable, Callable, Optional, Dict, Any, List, Set, Tuple
+
+import orjson
 
 from backend.config import settings
 
@@ -229,10 +230,10 @@ class ClaudeRunner:
                     }
                 }
 
-                json_line = json.dumps(input_msg) + "\n"
-                logger.debug(f"Sending to stdin: {json_line.strip()}")
+                json_line = orjson.dumps(input_msg) + b"\n"
+                logger.debug("Sending to stdin: %s", json_line[:-1])
 
-                self._process.stdin.write(json_line.encode())
+                self._process.stdin.write(json_line)
                 await self._process.stdin.drain()
 
                 # Read responses until we get a result or timeout
@@ -306,8 +307,8 @@ class ClaudeRunner:
     def _parse_stream_line(self, line: str) -> Optional[StreamEvent]:
         """Parse a single line of stream output."""
         try:
-            data = json.loads(line)
-        except json.JSONDecodeError:
+            data = orjson.loads(line)
+        except orjson.JSONDecodeError:
             # Not JSON, treat as plain text
             if line.strip():
                 return StreamEvent(type="text", content=line)
@@ -386,7 +387,7 @@ class ClaudeRunner:
             # System message (tool output, etc.)
             message = data.get("message", "")
             if isinstance(message, dict):
-                message = json.dumps(message)
+                message = orjson.dumps(message).decode("utf-8")
             return StreamEvent(
                 type="system",
                 content=str(message),
@@ -550,12 +551,16 @@ class RunnerManager:
     - Per-user resource limits
     """
 
-    def __init__(self, max_sessions_per_user: int = 5):
+    def __init__(self, max_sessions_per_user: int = 5, max_concurrent_requests: int = 20):
         self._runners: Dict[str, ClaudeRunner] = {}  # session_id -> runner
         self._user_sessions: Dict[int, List[str]] = {}  # user_id -> session_ids
         self._max_sessions_per_user = max_sessions_per_user
         self._cleanup_task: Optional[asyncio.Task] = None
         self._cleanup_interval = 300  # Cleanup every 5 minutes
+        self._tasks: Dict[str, Set[asyncio.Task]] = {}  # session_id -> request tasks
+        self._session_locks: Dict[str, asyncio.Lock] = {}  # session_id -> FIFO lock
+        # Caps requests streaming at once across all sessions
+        self._request_slots = asyncio.Semaphore(max_concurrent_requests)
 
     def get_runner(
         self,
@@ -602,8 +607,68 @@ class RunnerManager:
         """Get runner only if it exists."""
         return self._runners.get(session_id)
 
+    def snapshot(self) -> List[Tuple[str, Optional[int], ClaudeRunner]]:
+        """
+        Get a point-in-time copy of (session_id, user_id, runner) entries.
+
+        Taken without awaiting, so it is consistent with respect to other
+        coroutines mutating the manager.
+        """
+        owners = {
+            session_id: user_id
+            for user_id, session_ids in self._user_sessions.items()
+            for session_id in session_ids
+        }
+        return [
+            (session_id, owners.get(session_id), runner)
+            for session_id, runner in list(self._runners.items())
+        ]
+
+    def spawn(self, session_id: str, coro: Awaitable[Any]) -> asyncio.Task:
+        """
+        Run a request coroutine in the background for a session.
+
+        Requests for the same session run one at a time, in submission order,
+        and at most max_concurrent_requests run at once overall.
+        """
+        lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+        task = asyncio.create_task(self._run_serialized(lock, coro))
+        self._tasks.setdefault(session_id, set()).add(task)
+        task.add_done_callback(lambda t: self._task_done(session_id, t))
+        return task
+
+    async def _run_serialized(self, lock: asyncio.Lock, coro: Awaitable[Any]) -> Any:
+        """Await coro while holding the session lock and a request slot."""
+        try:
+            async with lock, self._request_slots:
+                return await coro
+        finally:
+            # Close a coroutine that was cancelled before it got the lock
+            coro.close()
+
+    def _task_done(self, session_id: str, task: asyncio.Task):
+        """Forget a finished request task and log unexpected failures."""
+        tasks = self._tasks.get(session_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[session_id]
+                self._session_locks.pop(session_id, None)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Request task for session {session_id} failed", exc_info=task.exception())
+
+    def is_busy(self, session_id: str) -> bool:
+        """Check whether a session has a request running or queued."""
+        return bool(self._tasks.get(session_id))
+
+    def cancel_tasks(self, session_id: str):
+        """Cancel running and queued request tasks for a session."""
+        for task in list(self._tasks.get(session_id, ())):
+            task.cancel()
+
     async def stop_runner(self, session_id: str, user_id: Optional[int] = None):
         """Stop a specific runner."""
+        self.cancel_tasks(session_id)
         runner = self._runners.get(session_id)
         if runner:
             await runner.stop()
@@ -628,6 +693,11 @@ class RunnerManager:
 
     async def stop_all(self):
         """Stop all runners."""
+        # Cancel spawned requests first and wait for them to unwind
+        tasks = [task for session_tasks in self._tasks.values() for task in session_tasks]
+        for session_id in list(self._tasks):
+            self.cancel_tasks(session_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
         for runner in list(self._runners.values()):
             await runner.stop()
         self._runners.clear()
@@ -709,8 +779,10 @@ class RunnerManager:
     def get_stats(self) -> Dict[str, Any]:
         """Get runner manager statistics."""
         total_runners = len(self._runners)
-        alive_runners = sum(1 for r in self._runners.values() if r.is_alive)
-        running_runners = sum(1 for r in self._runners.values() if r.is_running)
+        alive_runners = running_runners = 0
+        for r in self._runners.values():
+            alive_runners += r.is_alive
+            running_runners += r.is_running
 
         return {
             "total_runners": total_runners,
@@ -722,4 +794,7 @@ class RunnerManager:
 
 
 # Global runner manager
-runner_manager = RunnerManager(max_sessions_per_user=settings.max_concurrent_sessions)
+runner_manager = RunnerManager(
+    max_sessions_per_user=settings.max_concurrent_sessions,
+    max_concurrent_requests=settings.max_concurrent_requests,
+)
@@ -1,11 +1,14 @@
 """Session state management for Claude Code interactions."""
 
 import uuid
+from collections import Counter, OrderedDict, deque
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Deque, Dict, List, Optional, Any
+
+import aiofiles
 
 from backend.config import settings
 
@@ -29,6 +32,43 @@ class ChatMessage:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
+# Number of recently used working directories remembered per user
+RECENT_DIRS_LIMIT = 10
+# Number of recent messages sent to API providers as conversation history
+API_HISTORY_LIMIT = 20
+
+
+@dataclass
+class UserTotals:
+    """Running per-user aggregates, updated as sessions change."""
+
+    sessions: int = 0
+    messages: int = 0
+    cost: float = 0.0
+    recent_dirs: "OrderedDict[str, Path]" = field(default_factory=OrderedDict)
+    dir_counts: "Counter[Path]" = field(default_factory=Counter)  # sessions per working directory
+
+    def use_directory(self, path: Path):
+        """Mark a working directory as most recently used."""
+        key = str(path)
+        self.recent_dirs[key] = path
+        self.recent_dirs.move_to_end(key)
+        if len(self.recent_dirs) > RECENT_DIRS_LIMIT:
+            self.recent_dirs.popitem(last=False)
+
+    def move_session(self, old: Path, new: Path):
+        """Move one session's count from one working directory to another."""
+        self.dir_counts[old] -= 1
+        if self.dir_counts[old] <= 0:
+            del self.dir_counts[old]
+        self.dir_counts[new] += 1
+
+    def most_used_directory(self) -> Optional[Path]:
+        """Working directory shared by the most sessions."""
+        top = self.dir_counts.most_common(1)
+        return top[0][0] if top else None
+
+
 @dataclass
 class SessionContext:
     """Context for a Claude Code session."""
@@ -43,14 +83,82 @@ class SessionContext:
     claude_session_id: Optional[str] = None  # Claude Code's internal session ID
     title: Optional[str] = None
     total_cost: float = 0.0
+    last_typing_time: float = field(default=0.0, init=False, repr=False, compare=False)  # time.monotonic()
+    _version: int = field(default=0, init=False, repr=False, compare=False)
+    _cached_info: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    _cached_version: int = field(default=-1, init=False, repr=False, compare=False)
+    _message_rows: List[Dict[str, Any]] = field(default_factory=list, init=False, repr=False, compare=False)
+    _totals: Optional[UserTotals] = field(default=None, init=False, repr=False, compare=False)
+    _api_messages: Deque[Dict[str, str]] = field(
+        default_factory=lambda: deque(maxlen=API_HISTORY_LIMIT), init=False, repr=False, compare=False
+    )
+
+    def touch(self):
+        """Invalidate cached projections after a state change."""
+        self._version += 1
 
     def add_message(self, role: str, content: str, **metadata) -> ChatMessage:
         """Add a message to the session."""
         msg = ChatMessage(role=role, content=content, metadata=metadata)
         self.messages.append(msg)
+        self._message_rows.append({"role": role, "content": content, "timestamp": msg.timestamp})
+        self._api_messages.append({"role": role, "content": content})
+        if self._totals:
+            self._totals.messages += 1
         self.updated_at = datetime.now()
+        self.touch()
         return msg
 
+    def clear_history(self):
+        """Clear messages and cost but keep the session."""
+        if self._totals:
+            self._totals.messages -= len(self.messages)
+            self._totals.cost -= self.total_cost
+        self.messages.clear()
+        self._message_rows.clear()
+        self._api_messages.clear()
+        self.total_cost = 0
+        self.touch()
+
+    def set_working_directory(self, path: Path):
+        """Change the session working directory."""
+        if self._totals:
+            self._totals.move_session(self.working_directory, path)
+            self._totals.use_directory(path)
+        self.working_directory = path
+        self.touch()
+
+    def info(self) -> Dict[str, Any]:
+        """Get a summary projection of the session (cached until next change)."""
+        if self._cached_version != self._version or self._cached_info is None:
+            self._cached_info = {
+                "session_id": self.session_id,
+                "user_id": self.user_id,
+                "working_directory": str(self.working_directory),
+                "state": self.state.value,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+                "message_count": len(self.messages),
+                "total_cost": self.total_cost,
+                "title": self.title,
+            }
+            self._cached_version = self._version
+        return self._cached_info
+
+    def message_rows(self) -> List[Dict[str, Any]]:
+        """Get messages as plain dicts, maintained alongside add_message."""
+        if len(self._message_rows) != len(self.messages):
+            # Messages were changed outside add_message; rebuild
+            self._message_rows = [
+                {"role": m.role, "content": m.content, "timestamp": m.timestamp}
+                for m in self.messages
+            ]
+        return self._message_rows
+
+    def api_messages(self) -> List[Dict[str, str]]:
+        """Get the last API_HISTORY_LIMIT messages in provider chat format."""
+        return list(self._api_messages)
+
     def get_recent_messages(self, limit: int = 10) -> List[ChatMessage]:
         """Get the most recent messages."""
         return self.messages[-limit:]
@@ -90,6 +198,7 @@ class SessionManager:
         self._sessions: Dict[str, SessionContext] = {}  # session_id -> context
         self._user_sessions: Dict[int, List[str]] = {}  # user_id -> session_ids
         self._active_session: Dict[int, str] = {}  # user_id -> active session_id
+        self._user_totals: Dict[int, UserTotals] = {}  # user_id -> aggregates
 
     def create_session(
         self,
@@ -108,6 +217,12 @@ class SessionManager:
 
         self._sessions[session_id] = context
 
+        totals = self._user_totals.setdefault(user_id, UserTotals())
+        totals.sessions += 1
+        totals.dir_counts[context.working_directory] += 1
+        totals.use_directory(context.working_directory)
+        context._totals = totals
+
         if user_id not in self._user_sessions:
             self._user_sessions[user_id] = []
         self._user_sessions[user_id].append(session_id)
@@ -137,23 +252,42 @@ class SessionManager:
                 return True
         return False
 
+    def clear_active(self, user_id: int):
+        """Unset the active session for a user."""
+        self._active_session.pop(user_id, None)
+
     def get_user_sessions(self, user_id: int) -> List[SessionContext]:
         """Get all sessions for a user."""
         session_ids = self._user_sessions.get(user_id, [])
         return [self._sessions[sid] for sid in session_ids if sid in self._sessions]
 
+    def get_user_totals(self, user_id: int) -> UserTotals:
+        """Get running totals for a user without scanning their sessions."""
+        return self._user_totals.get(user_id) or UserTotals()
+
+    def get_recent_directories(self, user_id: int, limit: int = RECENT_DIRS_LIMIT) -> List[Path]:
+        """Get a user's working directories, most recently used first."""
+        totals = self._user_totals.get(user_id)
+        if not totals:
+            return []
+        return list(reversed(totals.recent_dirs.values()))[:limit]
+
     def update_session_state(self, session_id: str, state: SessionState):
         """Update the state of a session."""
         session = self._sessions.get(session_id)
         if session:
             session.state = state
             session.updated_at = datetime.now()
+            session.touch()
 
     def add_cost(self, session_id: str, cost: float):
         """Add cost to a session."""
         session = self._sessions.get(session_id)
         if session:
             session.total_cost += cost
+            if session._totals:
+                session._totals.cost += cost
+            session.touch()
 
     def export_session(self, session_id: str) -> Optional[str]:
         """Export a session to markdown."""
@@ -162,17 +296,19 @@ class SessionManager:
             return session.to_markdown()
         return None
 
-    async def save_session_to_file(self, session_id: str):
-        """Save a session to a markdown file."""
+    async def save_session_to_file(self, session_id: str) -> Optional[str]:
+        """Save a session to a markdown file, returning the markdown written."""
         session = self._sessions.get(session_id)
         if not session:
-            return
+            return None
 
         settings.ensure_directories()
         file_path = settings.sessions_path / f"{session_id}.md"
 
         markdown = session.to_markdown()
-        file_path.write_text(markdown, encoding="utf-8")
+        async with aiofiles.open(file_path, "w", encoding="utf-8") as f:
+            await f.write(markdown)
+        return markdown
 
 
 # Global session manager
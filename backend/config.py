@@ -1,5 +1,6 @@
 """Configuration management using pydantic-settings."""
 
+from functools import cached_property
 from pathlib import Path
 from typing import List
 
@@ -32,18 +33,22 @@ class Settings(BaseSettings):
     # Anthropic API
     anthropic_api_key: str = ""
     anthropic_model: str = "claude-sonnet-4-20250514"
+    anthropic_rpm: int = 50  # Requests per minute; 0 disables client-side limiting
 
     # OpenAI API
     openai_api_key: str = ""
     openai_model: str = "gpt-4o"
+    openai_rpm: int = 500
 
     # OpenRouter API
     openrouter_api_key: str = ""
     openrouter_model: str = "anthropic/claude-sonnet-4"
+    openrouter_rpm: int = 0
 
     # GLM (智谱AI) API
     glm_api_key: str = ""
     glm_model: str = "glm-4.7"
+    glm_rpm: int = 0
 
     # Server
     api_host: str = "0.0.0.0"
@@ -53,12 +58,14 @@ class Settings(BaseSettings):
     # Rate Limiting
     rate_limit_requests: int = 10
     rate_limit_window: int = 60
+    redis_url: str = ""  # redis://localhost:6379/0 to share rate limits across bot processes
 
     # Workspace
     workspace_path: str = "./workspace"
 
     # Database
     database_url: str = "sqlite+aiosqlite:///./workspace/ccbot.db"
+    db_pool_size: int = 5  # Pooled read connections for dashboard queries
 
     # Logging
     log_level: str = "INFO"
@@ -68,6 +75,9 @@ class Settings(BaseSettings):
 
     # Performance
     max_concurrent_sessions: int = 5  # Max concurrent sessions per user
+    max_concurrent_requests: int = 20  # Max LLM requests streaming at once across all users
+    http_max_connections: int = 20  # Pooled connections to the LLM provider API
+    http_max_keepalive: int = 10  # Idle connections kept open for reuse
     session_timeout_minutes: int = 120  # Auto-cleanup after inactivity
     max_message_history: int = 100  # Max messages to keep in session
 
@@ -75,6 +85,7 @@ class Settings(BaseSettings):
     enable_file_uploads: bool = False  # Allow file uploads (future feature)
     enable_voice_messages: bool = False  # Voice message support (future)
     auto_save_sessions: bool = True  # Auto-save sessions periodically
+    enable_profiling: bool = False  # Serve pyinstrument reports for ?profile requests (dev only)
 
     @property
     def allowed_users_list(self) -> List[int]:
@@ -83,16 +94,16 @@ class Settings(BaseSettings):
             return []
         return [int(uid.strip()) for uid in self.allowed_users.split(",") if uid.strip()]
 
-    @property
+    @cached_property
     def approved_directory_path(self) -> Path:
-        """Get approved directory as Path."""
+        """Get approved directory as Path (resolved once)."""
         if self.approved_directory:
             return Path(self.approved_directory).expanduser().resolve()
         return Path.home() / "projects"
 
-    @property
+    @cached_property
     def workspace_path_resolved(self) -> Path:
-        """Get workspace path as Path."""
+        """Get workspace path as Path (resolved once)."""
         return Path(self.workspace_path).expanduser().resolve()
 
     @property
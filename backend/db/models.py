@@ -1,9 +1,11 @@
 """Database models using aiosqlite."""
 
+import asyncio
 import aiosqlite
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List
+from typing import Iterable, Optional, List, Tuple
 from dataclasses import dataclass
 
 from backend.config import settings
@@ -49,18 +51,44 @@ class DailyRequestCount:
 class Database:
     """Database manager for session persistence."""
 
-    def __init__(self, db_path: Optional[Path] = None):
+    def __init__(self, db_path: Optional[Path] = None, pool_size: Optional[int] = None):
         self.db_path = db_path or Path(settings.database_url.replace("sqlite+aiosqlite:///", ""))
+        self.pool_size = pool_size or settings.db_pool_size
         self._conn: Optional[aiosqlite.Connection] = None
+        self._pool: Optional[asyncio.Queue] = None
+        self._pool_conns: List[aiosqlite.Connection] = []
 
     async def connect(self):
-        """Connect to the database and create tables."""
+        """Connect to the database, create tables and open the read pool."""
         self._conn = await aiosqlite.connect(self.db_path)
         self._conn.row_factory = aiosqlite.Row
+        # WAL lets pooled readers run alongside the writer connection
+        await self._conn.execute("PRAGMA journal_mode=WAL")
         await self._create_tables()
 
+        self._pool = asyncio.Queue()
+        for _ in range(self.pool_size):
+            conn = await aiosqlite.connect(self.db_path)
+            conn.row_factory = aiosqlite.Row
+            self._pool_conns.append(conn)
+            self._pool.put_nowait(conn)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a pooled connection for read queries."""
+        conn = await self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put_nowait(conn)
+
     async def close(self):
-        """Close the database connection."""
+        """Close the database connections."""
+        for conn in self._pool_conns:
+            await conn.close()
+        self._pool_conns.clear()
+        self._pool = None
+
         if self._conn:
             await self._conn.close()
             self._conn = None
@@ -102,6 +130,7 @@ class Database:
             CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages(session_id);
             CREATE INDEX IF NOT EXISTS idx_daily_counts_date ON daily_request_counts(date);
             CREATE INDEX IF NOT EXISTS idx_daily_counts_user_id ON daily_request_counts(user_id);
+            CREATE INDEX IF NOT EXISTS idx_drc_date_user ON daily_request_counts(date, user_id, request_count);
         """)
         await self._conn.commit()
 
@@ -265,6 +294,21 @@ class Database:
             return DailyRequestCount(**dict(row))
         return None
 
+    async def bulk_increment(self, counts: Iterable[Tuple[str, int, int]]):
+        """Add (date, user_id, count) request counts in one transaction."""
+        now = datetime.now()
+        await self._conn.executemany(
+            """
+            INSERT INTO daily_request_counts (date, user_id, request_count, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(date, user_id) DO UPDATE SET
+                request_count = request_count + excluded.request_count,
+                updated_at = excluded.updated_at
+            """,
+            [(day, user_id, count, now, now) for day, user_id, count in counts]
+        )
+        await self._conn.commit()
+
     async def get_daily_request_counts(self, start_date: str, end_date: str, user_id: int = None) -> List[DailyRequestCount]:
         """Get daily request counts for a date range."""
         if user_id:
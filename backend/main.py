@@ -1,20 +1,25 @@
 """Main application entry point."""
 
 import asyncio
+import importlib.util
 import logging
 import signal
 import sys
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
 from backend.config import settings
+from backend.api.responses import ORJSONResponse
 from backend.api.routes import router as api_router
 from backend.bot.handlers import create_bot_application
+from backend.bot.middleware import close_rate_limiter, request_counter
+from backend.claude.providers import close_llm_providers
 from backend.claude.runner import runner_manager
 from backend.memory.manager import memory_manager
 from backend.db.models import db
@@ -48,6 +53,9 @@ async def lifespan(app: FastAPI):
     await db.connect()
     logger.info("Database connected")
 
+    # Start batched request count writes
+    await request_counter.start()
+
     # Initialize memory manager
     await memory_manager.initialize()
     logger.info("Memory manager initialized")
@@ -75,6 +83,7 @@ async def lifespan(app: FastAPI):
         await bot_app.updater.stop()
         await bot_app.stop()
         await bot_app.shutdown()
+    await close_rate_limiter()
 
     # Stop cleanup task
     await runner_manager.stop_cleanup_task()
@@ -82,7 +91,11 @@ async def lifespan(app: FastAPI):
     # Stop all runners
     await runner_manager.stop_all()
 
-    # Close database
+    # Close pooled LLM API connections
+    await close_llm_providers()
+
+    # Write remaining request counts, then close database
+    await request_counter.stop()
     await db.close()
 
     logger.info("Shutdown complete")
@@ -93,7 +106,8 @@ app = FastAPI(
     title="ccBot",
     description="Telegram bot for Claude Code control",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -105,6 +119,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request profiling (dev only): append ?profile to any URL for a pyinstrument report
+if settings.enable_profiling:
+    from pyinstrument import Profiler
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        """Profile the request and return the call tree instead of the response."""
+        if "profile" not in request.query_params:
+            return await call_next(request)
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        await call_next(request)
+        profiler.stop()
+        return HTMLResponse(profiler.output_html())
+
 # Include API routes
 app.include_router(api_router)
 
@@ -127,12 +157,16 @@ async def root():
 
 def main():
     """Main entry point."""
+    # Use uvloop and httptools (from uvicorn[standard]) when installed,
+    # otherwise let uvicorn fall back to asyncio and h11
     uvicorn.run(
         "backend.main:app",
         host=settings.api_host,
         port=settings.api_port,
         reload=False,
-        log_level=settings.log_level.lower()
+        log_level=settings.log_level.lower(),
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "auto",
+        http="httptools" if importlib.util.find_spec("httptools") else "auto"
     )
 
 
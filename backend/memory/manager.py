@@ -3,9 +3,10 @@
 import re
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
 import aiofiles
+import aiofiles.os
 
 from backend.config import settings
 
@@ -27,6 +28,7 @@ class MemoryManager:
         self.workspace = workspace_path or settings.workspace_path_resolved
         self.memory_path = self.workspace / "memory"
         self.sessions_path = self.workspace / "sessions"
+        self._soul_cache: Optional[Tuple[int, str]] = None  # (mtime_ns, content)
 
     async def initialize(self):
         """Initialize workspace with default files."""
@@ -205,8 +207,16 @@ These tools are provided by Claude Code. Use them responsibly and always verify
             await f.write(content)
 
     async def get_soul(self) -> str:
-        """Get the SOUL.md content."""
-        return await self.read_file("SOUL.md") or ""
+        """Get the SOUL.md content, re-reading only when the file changes."""
+        try:
+            mtime_ns = (await aiofiles.os.stat(self.workspace / "SOUL.md")).st_mtime_ns
+        except FileNotFoundError:
+            self._soul_cache = None
+            return ""
+
+        if self._soul_cache is None or self._soul_cache[0] != mtime_ns:
+            self._soul_cache = (mtime_ns, await self.read_file("SOUL.md") or "")
+        return self._soul_cache[1]
 
     async def get_user_profile(self) -> str:
         """Get the USER.md content."""